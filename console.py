@@ -129,13 +129,12 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
-        obj_dict = storage.all(cls_name)
-        key = f"{cls_name}.{obj_id}"
+        obj = storage.get(cls_name, obj_id)
 
-        if key not in obj_dict:
+        if obj is None:
             print("** no instance found **")
         else:
-            print(obj_dict[key])
+            print(obj)
 
     def do_destroy(self, args):
         """
@@ -154,14 +153,12 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
-        obj_dict = storage.all(classes[cls_name])
-        key = f"{cls_name}.{obj_id}"
+        obj = storage.get(classes[cls_name], obj_id)
 
-        if key not in obj_dict:
+        if obj is None:
             print("** no instance found **")
         else:
-            storage.delete(obj_dict[key])
-            storage.save()
+            storage.delete_many([obj])
             print(f"{obj_id} deleted")
             return
 
@@ -172,9 +169,7 @@ class HBNBCommand(cmd.Cmd):
         """
         if input("Are you sure you want to delete everything in the database?\
                   This cannot be undone. [y/N]: ").lower() == "y":
-            size = len(storage.all())
-            for model in list(storage.all().values()):
-                model.delete()
+            size = storage.truncate()
             print(f"Database reset. {size} models have been deleted.")
 
     def do_all(self, args):
@@ -185,11 +180,16 @@ class HBNBCommand(cmd.Cmd):
             if args not in classes:
                 print("** class doesn't exist **")
                 return
-            objects = storage.all(classes[args])
+            objects = storage.iter(classes[args])
         else:
-            objects = storage.all()
+            objects = storage.iter()
 
-        print([str(obj) for obj in objects.values()])
+        # streamed in the format of print(list_of_strings)
+        separator = "["
+        for obj in objects:
+            sys.stdout.write(separator + repr(str(obj)))
+            separator = ", "
+        print("[]" if separator == "[" else "]")
 
     def do_count(self, args):
         """
@@ -204,14 +204,24 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
-        count = len(storage.all(cls))
+        count = storage.count(cls)
         print(count)
 
     def do_size(self, args):
         """
         Displays the size of the database, or the number of objects saved.
         """
-        print(len(storage.all()))
+        print(storage.count())
+
+    def do_stats(self, args):
+        """
+        Displays the number of objects and the last update of each class
+        """
+        for cls_name, stats in storage.stats().items():
+            updated_at = stats["updated_at"]
+            print("{}: {} (last updated: {})".format(
+                cls_name, stats["count"],
+                updated_at.isoformat() if updated_at else "never"))
 
     def do_update(self, args):
         """
@@ -240,14 +250,12 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
 
-        obj_dict = storage.all(cls_name)
-        key = f"{cls_name}.{obj_id}"
+        obj = storage.get(cls_name, obj_id)
 
-        if key not in obj_dict:
+        if obj is None:
             print("** no instance found **")
             return
         else:
-            obj = obj_dict[key]
             setattr(obj, attr_name, attr_value)
             storage.save()
             print("** instance updated **")
@@ -9,6 +9,12 @@ from os import getenv
 if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
     from models.engine.db_storage import DBStorage
     storage = DBStorage()
+elif getenv("HBNB_TYPE_STORAGE") == "sqlite":  # embedded SQL storage
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
+elif getenv("HBNB_TYPE_STORAGE") == "mmap":  # memory-mapped file storage
+    from models.engine.mmap_storage import MmapStorage
+    storage = MmapStorage()
 else:  # file storage
     from models.engine.file_storage import FileStorage
     storage = FileStorage()
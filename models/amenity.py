@@ -7,7 +7,7 @@ from models.base_model import BaseModel
 from os import getenv
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):  # database storage
     from sqlalchemy import Column, String, Table, ForeignKey
     from sqlalchemy.orm import relationship
     from models.base_model import Base
@@ -70,8 +70,7 @@ else:
             """
             returns list of Place instances with amenity
             """
-            return [place for place in models.storage.all("Place").values()
-                    if place.amenity_ids == self.id]
+            return models.storage.children("Place", "amenity_ids", self.id)
 
         def __init__(self, *args, **kwargs):
             """
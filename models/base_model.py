@@ -4,12 +4,14 @@ This module contains the BaseModel class.
 """
 from datetime import datetime
 import uuid
+import models
+from models.engine import timestamps
 from sqlalchemy import Column, String, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from os import getenv
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):
     Base = declarative_base()
 else:
     Base = object
@@ -17,6 +19,105 @@ else:
 time_format = "%Y-%m-%dT%H:%M:%S.%f"
 
 
+def hold(obj, storage):
+    """
+    Records that a storage (a weak reference to it) holds obj, so that
+    assigning one of obj's attributes, or changing one of its lists in
+    place, marks it dirty there; a no-op for database models, which the
+    session tracks
+    """
+    storages = getattr(obj, "_storages", None)
+    if storages is not None and storage not in storages:
+        object.__setattr__(obj, "_storages", storages + (storage,))
+        for name, value in obj.__dict__.items():
+            if isinstance(value, list):
+                obj.__dict__[name] = track(obj, name, value)
+
+
+def track(obj, name, value):
+    """
+    Returns a list value as a TrackedList held by obj as attribute name
+    """
+    if type(value) is TrackedList and value.owner is obj and \
+            value.name == name:
+        return value
+    return TrackedList(value, obj, name)
+
+
+def changed(obj, name):
+    """
+    Marks obj dirty, for attribute name, in the storages holding it
+    """
+    for ref in getattr(obj, "_storages", ()):
+        storage = ref()
+        if storage is not None:
+            storage.mark_dirty(obj, name)
+
+
+def copy_state(obj):
+    """
+    Returns a copy of obj's attributes that changes made to its lists in
+    place do not reach (used by storage rollbacks)
+    """
+    return {name: list(value) if isinstance(value, list) else value
+            for name, value in obj.__dict__.items()}
+
+
+def restore_state(obj, state):
+    """
+    Replaces obj's attributes with a state, without marking it dirty
+    """
+    held = getattr(obj, "_storages", ())
+    obj.__dict__.clear()
+    for name, value in state.items():
+        if held and isinstance(value, list):
+            value = track(obj, name, value)
+        obj.__dict__[name] = value
+
+
+class TrackedList(list):
+    """
+    List attribute of a model held by a storage (e.g. Place.amenity_ids)
+    that marks its owner dirty there when changed in place, as assigning
+    the attribute does, so that indexes and the next save() see the
+    change; models not held by a storage keep plain lists
+
+    Attributes:
+        owner (BaseModel):  model holding the list
+        name (str):         attribute name of the list
+    """
+    __slots__ = ("owner", "name")
+
+    def __init__(self, values=(), owner=None, name=None):
+        """
+        Initializes a list of values held by owner as attribute name
+        """
+        super().__init__(values)
+        self.owner = owner
+        self.name = name
+
+
+def _tracked(method):
+    """
+    Returns a list method that reports the change to the list's owner
+    """
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if self.owner is not None:
+            changed(self.owner, self.name)
+        return result
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ("append", "extend", "insert", "remove", "pop", "clear",
+              "sort", "reverse", "__setitem__", "__delitem__", "__iadd__",
+              "__imul__"):
+    setattr(TrackedList, _name, _tracked(getattr(list, _name)))
+del _name
+
+
 class BaseModel:
     """
     BaseModel class from which all other classes inherit
@@ -32,8 +133,9 @@ class BaseModel:
         save(self):     changes updated_at attribute to current time
         to_dict(self):  returns dictionary for instance
         delete(self):   deletes current instance
+        __setattr__(self, name, value): sets attribute, flags it for saving
     """
-    if getenv("HBNB_TYPE_STORAGE") == "db":
+    if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):
         id = Column(String(60),
                     nullable=False,
                     primary_key=True)
@@ -44,18 +146,43 @@ class BaseModel:
                             default=datetime.utcnow,
                             nullable=False)
     else:
+        # _storages: weak references to the storages holding the
+        # instance, kept out of __dict__ so it is neither saved nor shown
+        __slots__ = ("__dict__", "__weakref__", "_storages")
         id = None
-        created_at = datetime.utcnow()
-        updated_at = datetime.utcnow()
+        created_at = timestamps.Timestamp()
+        updated_at = timestamps.Timestamp()
+
+        def __new__(cls, *args, **kwargs):
+            """
+            Creates an instance held by no storage yet
+            """
+            obj = super().__new__(cls)
+            object.__setattr__(obj, "_storages", ())
+            return obj
+
+        def __setattr__(self, name, value):
+            """
+            Sets an attribute and marks the instance dirty in the
+            storages holding it
+            """
+            if self._storages and isinstance(value, list):
+                value = track(self, name, value)
+            super().__setattr__(name, value)
+            for ref in self._storages:
+                storage = ref()
+                if storage is not None:
+                    storage.mark_dirty(self, name)
 
     def __init__(self, *args, **kwargs):
         """
         Initializes a new BaseModel instance
         """
-        if getenv ("HBNB_TYPE_STORAGE") != "db":
-            self.id = kwargs.get("id", str(uuid.uuid4()))
-            self.created_at = kwargs.get("created_at", datetime.utcnow())
-            self.updated_at = kwargs.get("updated_at", datetime.utcnow())
+        # set in every mode so related objects can reference the id
+        # before the first flush
+        self.id = kwargs.get("id", str(uuid.uuid4()))
+        self.created_at = kwargs.get("created_at", datetime.utcnow())
+        self.updated_at = kwargs.get("updated_at", datetime.utcnow())
 
         for key, value in kwargs.items():
             if key != "__class__":
@@ -65,6 +192,8 @@ class BaseModel:
         """
         Returns a string representation of the instance
         """
+        # __dict__ shows datetimes, not the strings kept until first read
+        timestamps.Timestamp.resolve(self)
         return f"[{self.__class__.__name__}] ({self.id}) {self.__dict__}"
 
     def save(self):
@@ -82,23 +211,20 @@ class BaseModel:
         """
         Converts instance to dictionary
         """
-        time_format = "%Y-%m-%dT%H:%M:%S.%f"
         inst_dict = self.__dict__.copy()
         inst_dict["__class__"] = self.__class__.__name__
-        inst_dict["created_at"] = self.created_at.strftime(
-            time_format) if isinstance(self.created_at,
-                                       datetime) else self.created_at
-        inst_dict["updated_at"] = self.updated_at.strftime(
-            time_format) if isinstance(self.updated_at,
-                                       datetime) else self.updated_at
+        for name in ("created_at", "updated_at"):
+            value = inst_dict[name] if name in inst_dict else \
+                getattr(self, name)
+            inst_dict[name] = timestamps.format(
+                value) if isinstance(value, datetime) else value
         if "_sa_instance_state" in inst_dict:
             del inst_dict["_sa_instance_state"]
         return inst_dict
 
     def delete(self):
         """
-        Deletes current instance
+        Deletes current instance, and the objects depending on it
         """
         from models import storage
-        storage.delete(self)
-        storage.save()
+        storage.delete_many([self])
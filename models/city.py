@@ -8,7 +8,7 @@ from os import getenv
 from models.state import State
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):  # database storage
     from sqlalchemy import Column, String, ForeignKey
     from sqlalchemy.orm import relationship
     from models.base_model import Base
@@ -24,7 +24,8 @@ if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
         __tablename__ = "cities"
         state_id = Column(String(60),
                           ForeignKey("states.id"),
-                          nullable=False)
+                          nullable=False,
+                          index=True)
         name = Column(String(128),
                       nullable=False)
         places = relationship("Place",
@@ -48,12 +49,7 @@ if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
                 return
 
             # Check if given state id exists in database
-            state_exists = False
-            for state in models.storage.all(State).values():
-                if state.id == self.state_id:
-                    state_exists = True
-                    break
-            if not state_exists:
+            if not models.storage.exists(State, self.state_id):
                 print("** state with that id does not exist **")
                 return
 
@@ -93,12 +89,7 @@ else:
                 return
 
             # Check if given state id exists in database
-            state_exists = False
-            for state in models.storage.all(State).values():
-                if state.id == self.state_id:
-                    state_exists = True
-                    break
-            if not state_exists:
+            if not models.storage.exists(State, self.state_id):
                 print("** state with that id does not exist **")
                 return
 
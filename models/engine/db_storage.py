@@ -2,9 +2,18 @@
 """
 This module defines the DBStorage class.
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, func, inspect, literal, null, \
+    select, union_all
+from sqlalchemy.orm import Session, sessionmaker, scoped_session, \
+    joinedload, selectinload, subqueryload
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.pool import QueuePool
+from concurrent.futures import ThreadPoolExecutor
 from models.base_model import Base
+from models.engine import pool
+from models.engine import query
+from models.engine.routing import Router, RoutingSession
+from models.engine.file_storage import build_objects, check_references
 from models.user import User
 from models.state import State
 from models.city import City
@@ -12,6 +21,7 @@ from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
 import os
+from contextlib import contextmanager
 
 
 class DBStorage:
@@ -21,10 +31,30 @@ class DBStorage:
     Attributes:
         __engine (sqlalchemy.engine.base.Engine):   database engine
         __session (sqlalchemy.orm.session.Session): database session
+        __metrics (pool.Metrics):   connection pool telemetry
+        __replicas (list):  (engine, pool.Metrics) of each read replica
+        __router (Router):  routes reads to the replicas, or None
 
     Methods:
-        __init__(self):         initializes the database engine
-        all(self, cls=None):    returns a dictionary of objects
+        __init__(self, url=None, replicas=None, policy=None):
+                                initializes the database engines
+        engine_for(self, url):  creates the engine for a database URL
+        all(self, cls=None, load=None, columns=None): returns a
+                                dictionary of objects (or of columns)
+        get(self, cls, id, load=None): returns one object by class and id
+        exists(self, cls, id):  checks if an object is stored
+        missing(self, cls, ids): returns the ids not stored
+        iter(self, cls=None, batch_size=1000): yields stored objects
+        new_many(self, objs, cls=None): adds many objects at once
+        save_many(self, objs, cls=None): adds and commits many objects
+        delete_many(self, objs): deletes objects and their dependents
+        truncate(self, cls=None): deletes every object (of a class)
+        transaction(self):      commits once, rolls back on error
+        find(self, cls, ...):   returns objects matching criteria
+        explain(self, cls, ...): returns the SQL find() would run
+        count(self, cls=None):  returns the number of objects
+        stats(self):            returns per-class counts and last update
+        pool_stats(self):       returns connection pool metrics
         new(self, obj):         creates a new object
         save(self):             saves current session
         delete(self, obj=None): deletes an object
@@ -33,6 +63,13 @@ class DBStorage:
     __engine = None
     __session = None
 
+    probe_size = 500
+    # file-storage id list attributes -> relationship holding the objects
+    relations = {"amenity_ids": "amenities"}
+    # load= strategy -> loader option eagerly loading a relationship
+    loaders = {"selectin": selectinload, "joined": joinedload,
+               "subquery": subqueryload}
+
     classes = {
         "User": User,
         "State": State,
@@ -42,9 +79,24 @@ class DBStorage:
         "Review": Review
     }
 
-    def __init__(self):
+    def __init__(self, url=None, replicas=None, policy=None):
         """
         Initializes the database connection
+
+        The connection pool is sized by the HBNB_MYSQL_POOL_SIZE,
+        HBNB_MYSQL_MAX_OVERFLOW, HBNB_MYSQL_POOL_TIMEOUT,
+        HBNB_MYSQL_POOL_RECYCLE and HBNB_MYSQL_PRE_PING variables (see
+        models.engine.pool).
+
+        Args:
+            url (str):          database URL (default: the MySQL database
+                                named by the HBNB_MYSQL_* variables)
+            replicas (list):    URLs of read replicas (default: the
+                                comma-separated HBNB_MYSQL_REPLICAS); reads
+                                are routed to them (see models.engine.routing)
+            policy (str):       replica choice, "round_robin" or
+                                "least_loaded" (default:
+                                HBNB_MYSQL_REPLICA_POLICY or round_robin)
         """
         user = os.getenv("HBNB_MYSQL_USER")
         password = os.getenv("HBNB_MYSQL_PWD")
@@ -52,42 +104,559 @@ class DBStorage:
         db = os.getenv("HBNB_MYSQL_DB")
         env = os.getenv("HBNB_ENV")
 
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.format(
-            user, password, host, db), pool_pre_ping=True)
+        if url is None:
+            url = 'mysql+mysqldb://{}:{}@{}/{}'.format(
+                user, password, host, db)
+        self.__engine, self.__metrics = self.__connect(url)
+        if replicas is None:
+            replicas = [replica.strip() for replica in
+                        (os.getenv("HBNB_MYSQL_REPLICAS") or "").split(",")
+                        if replica.strip()]
+        self.__replicas = [self.__connect(replica) for replica in replicas]
+        self.__router = None
+        if self.__replicas:
+            self.__router = Router(
+                self.__engine, self.__replicas,
+                policy or os.getenv("HBNB_MYSQL_REPLICA_POLICY") or
+                "round_robin", float(os.getenv("HBNB_MYSQL_STICKY") or 1))
         if os.getenv("HBNB_ENV") == "test":
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
+    def __connect(self, url):
+        """
+        Returns an engine for url made by engine_for(), and the metrics
+        attached to it
+        """
+        engine = self.engine_for(url)
+        return engine, pool.Metrics().attach(engine)
+
+    def engine_for(self, url):
+        """
+        Returns an engine for url with the pool configured by the
+        HBNB_MYSQL_* variables
+        """
+        return create_engine(url, poolclass=pool.MeteredPool,
+                             **pool.options("HBNB_MYSQL_"))
+
+    def all(self, cls=None, load=None, columns=None):
         """
         Returns a dictionary of objects
+
+        Without a class, and with no changes waiting in the session, the
+        tables are read over concurrent connections (up to the pool size)
+        and the objects merged into the session without further queries.
+
+        Args:
+            cls (class or str): only objects of this class
+            load:               relationships to load eagerly with the
+                                objects (see __options()); without a class,
+                                each is loaded for the classes that have it
+            columns (list):     column names; if given, returns key ->
+                                {"id": ..., column: value} read in a single
+                                query instead of objects (see __columns())
         """
+        if columns is not None:
+            return self.__columns(cls, columns)
         obj_dict = {}
         objs = []
         if cls:
             if isinstance(cls, str):
                 cls = self.classes.get(cls)
             if cls:
-                objs = self.__session.query(cls).all()
+                objs = self.__session.query(cls).options(
+                    *self.__options(cls, load)).all()
         else:
-            for cls_name in self.classes.values():
-                objs.extend(self.__session.query(cls_name).all())
+            objs = self.__all_tables(load)
         for obj in objs:
             key = self.key_create(obj)
             obj_dict[key] = obj
 
         return obj_dict
 
+    def __all_tables(self, load):
+        """
+        Returns the objects of every class for all(), querying the tables
+        concurrently when the pool allows it and nothing unflushed or
+        uncommitted in the session could be missed by other connections
+        """
+        tables = list(self.classes.values())
+        session = self.__session()
+        engine = self.__engine
+        if self.__router is not None and not self.__router.pinned():
+            engine = self.__router.replica()
+        workers = min(len(tables), engine.pool.size()) \
+            if isinstance(engine.pool, QueuePool) else 1
+        if workers < 2 or session.in_transaction() or session.new or \
+                session.dirty or session.deleted:
+            objs = []
+            for table in tables:
+                objs.extend(session.query(table).options(
+                    *self.__options(table, load, strict=False)).all())
+            return objs
+        with ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(
+                lambda table: self.__fetch(engine, table, load), tables))
+        return [session.merge(obj, load=False)
+                for objs in results for obj in objs]
+
+    def __fetch(self, engine, table, load):
+        """
+        Returns the detached objects of one table, read on a connection
+        of its own
+        """
+        with Session(bind=engine, expire_on_commit=False) as session:
+            return session.query(table).options(
+                *self.__options(table, load, strict=False)).all()
+
+    def __columns(self, cls, columns):
+        """
+        Returns key -> {"id": id, column: value, ...} for a class (or
+        class name), or for every class at once with a UNION ALL, reading
+        only the listed columns and building no objects; a column a table
+        lacks is None in its rows
+
+        Raises:
+            ValueError: for a column no selected table has
+        """
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+            if cls is None:
+                return {}
+        tables = {name: table for name, table in self.classes.items()
+                  if cls is None or table is cls}
+        columns = [name for name in columns if name != "id"]
+        types = {}
+        for table in tables.values():
+            for name in columns:
+                if name in table.__table__.columns:
+                    types.setdefault(name, table.__table__.columns[name].type)
+        unknown = [name for name in columns if name not in types]
+        if unknown:
+            raise ValueError("unknown column: {}".format(", ".join(unknown)))
+        selects = []
+        for name, table in tables.items():
+            fields = [literal(name).label("class_name"), table.id]
+            for column in columns:
+                fields.append(
+                    getattr(table, column).label(column)
+                    if column in table.__table__.columns
+                    else null().cast(types[column]).label(column))
+            selects.append(select(*fields))
+        statement = selects[0] if len(selects) == 1 else union_all(*selects)
+        names = ["id"] + columns
+        return {"{}.{}".format(row[0], row[1]): dict(zip(names, row[1:]))
+                for row in self.__session.execute(statement)}
+
+    def get(self, cls, id, load=None):
+        """
+        Returns the object of a class (or class name) with the given id,
+        or None
+
+        Uses a primary-key lookup, answered from the session's identity
+        map when the object is already loaded; otherwise the relationships
+        named by load (see __options()) are loaded along with it.
+        """
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+        if cls is None or id is None:
+            return None
+        return self.__session.get(cls, id,
+                                  options=self.__options(cls, load))
+
+    def __options(self, cls, load, strict=True):
+        """
+        Returns the loader options for the load argument of all(), get()
+        and find(): a relationship name, a list of them (loaded with
+        "selectin"), or a dictionary of name -> "selectin", "joined" or
+        "subquery". Dotted names such as "cities.places" load nested
+        relationships, and file storage attribute names (amenity_ids) are
+        accepted for their relationships.
+
+        Raises:
+            ValueError: for an unknown relationship (when strict) or
+                        strategy
+        """
+        if not load:
+            return []
+        if isinstance(load, str):
+            load = [load]
+        if not isinstance(load, dict):
+            load = dict.fromkeys(load, "selectin")
+        options = []
+        for path, strategy in load.items():
+            loader = self.loaders.get(strategy)
+            if loader is None:
+                raise ValueError(
+                    "unknown loading strategy: {}".format(strategy))
+            option, target = None, cls
+            for name in path.split("."):
+                relationship = inspect(target).relationships.get(
+                    self.relations.get(name, name))
+                if relationship is None:
+                    if strict or option is not None:
+                        raise ValueError(
+                            "unknown relationship: {}".format(path))
+                    break
+                attribute = relationship.class_attribute
+                option = loader(attribute) if option is None else \
+                    getattr(option, loader.__name__)(attribute)
+                target = relationship.mapper.class_
+            else:
+                options.append(option)
+        return options
+
+    def exists(self, cls, id):
+        """
+        Checks if an object of a class (or class name) with the given id
+        is stored, probing the primary key instead of loading the row
+        """
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+        if cls is None or id is None:
+            return False
+        return self.__session.query(cls.id).filter(
+            cls.id == id).first() is not None
+
+    def missing(self, cls, ids):
+        """
+        Returns the set of ids with no stored object of a class (or class
+        name), probing probe_size primary keys per query
+        """
+        ids = set(ids)
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+        if cls is None:
+            return ids
+        found = set()
+        probe = list(ids)
+        for start in range(0, len(probe), self.probe_size):
+            chunk = probe[start:start + self.probe_size]
+            found.update(row[0] for row in self.__session.query(
+                cls.id).filter(cls.id.in_(chunk)))
+        return ids - found
+
+    def iter(self, cls=None, batch_size=1000):
+        """
+        Yields the objects of a class (or class name), or every object,
+        fetching batch_size rows at a time over a server-side cursor
+        instead of building the whole result
+        """
+        if cls is None:
+            tables = list(self.classes.values())
+        else:
+            tables = [self.classes.get(cls) if isinstance(cls, str) else cls]
+        for table in tables:
+            if table is None:
+                continue
+            yield from self.__session.query(table).yield_per(batch_size)
+
+    def find(self, cls, order_by=None, limit=None, offset=0, load=None,
+             **criteria):
+        """
+        Returns the objects of a class (or class name) matching criteria
+        (see models.engine.query), compiled into a single SELECT with its
+        WHERE, ORDER BY, LIMIT and OFFSET, and the relationships named by
+        load (see __options()) loaded eagerly
+
+        Raises:
+            ValueError: for an unknown class, attribute or operator
+        """
+        return self.__select(cls, order_by, limit, offset, criteria,
+                             load).all()
+
+    def explain(self, cls, order_by=None, limit=None, offset=0, load=None,
+                **criteria):
+        """
+        Returns the SQL that find() runs for the same arguments, followed
+        by the database's query plan for it when it can report one
+        """
+        select = self.__select(cls, order_by, limit, offset, criteria,
+                               load)
+        statement = select.statement.compile(
+            self.__engine, compile_kwargs={"literal_binds": True})
+        try:
+            with self.__engine.connect() as connection:
+                plan = connection.exec_driver_sql(
+                    ("EXPLAIN QUERY PLAN "
+                     if self.__engine.dialect.name == "sqlite"
+                     else "EXPLAIN ") + str(statement)).fetchall()
+        except (OperationalError, ProgrammingError):
+            # the database has no EXPLAIN for this statement
+            return str(statement)
+        return "{}\n{}".format(statement, "\n".join(
+            " | ".join(str(cell) for cell in row) for row in plan))
+
+    def __select(self, cls, order_by, limit, offset, criteria, load=None):
+        """
+        Builds the query for find() and explain()
+        """
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+        if cls is None:
+            raise ValueError("unknown class")
+        select = self.__session.query(cls).options(
+            *self.__options(cls, load))
+        for name, op, operand in query.parse(criteria):
+            column = getattr(cls, self.relations.get(name, name), None)
+            if column is None:
+                raise ValueError("unknown attribute: {}".format(name))
+            if op == "contains":
+                select = select.filter(column.any(id=operand))
+            elif op == "in":
+                select = select.filter(column.in_(operand))
+            else:
+                select = select.filter({
+                    "eq": column.__eq__, "ne": column.__ne__,
+                    "gt": column.__gt__, "gte": column.__ge__,
+                    "lt": column.__lt__, "lte": column.__le__}[op](operand))
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        for name in order_by or ():
+            column = getattr(cls, name.lstrip("-"), None)
+            if column is None:
+                raise ValueError("unknown attribute: {}".format(name))
+            select = select.order_by(column.desc() if name.startswith("-")
+                                     else column.asc())
+        if offset:
+            select = select.offset(offset)
+        if limit is not None:
+            select = select.limit(limit)
+        return select
+
+    def count(self, cls=None):
+        """
+        Returns the number of objects of a class (or class name), or of
+        all objects, with SELECT COUNT(*) instead of loading rows; every
+        table is counted in the same query
+        """
+        if cls is None:
+            return sum(self.__session.query(*[
+                select(func.count(table.id)).scalar_subquery()
+                for table in self.classes.values()]).one())
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+        if cls is None:
+            return 0
+        return self.__session.query(func.count(cls.id)).scalar()
+
+    def stats(self):
+        """
+        Returns class name -> {"count": number of objects, "updated_at":
+        latest updated_at or None} for every class, in one query of
+        per-table aggregates
+        """
+        row = self.__session.query(*[
+            aggregate for table in self.classes.values()
+            for aggregate in (
+                select(func.count(table.id)).scalar_subquery(),
+                select(func.max(table.updated_at)).scalar_subquery())]).one()
+        return {name: {"count": row[2 * i], "updated_at": row[2 * i + 1]}
+                for i, name in enumerate(self.classes)}
+
+    def pool_stats(self):
+        """
+        Returns the connection pool metrics: checkouts, connections in
+        use (now and at peak), connects, overflow connections,
+        invalidations, timeouts and checkout wait times in seconds, with
+        the pool's size, idle connections and current overflow; with
+        read replicas, "replicas" lists the same metrics for each
+        """
+        stats = self.__metrics.snapshot()
+        if self.__replicas:
+            stats["replicas"] = [metrics.snapshot()
+                                 for _, metrics in self.__replicas]
+        return stats
+
     def new(self, obj):
         """
         Creates a new object
         """
         self.__session.add(obj)
 
+    def new_many(self, objs, cls=None):
+        """
+        Adds many objects (instances or dictionaries) to the session after
+        checking all their references with one query per referenced
+        table; the next flush inserts them with batched INSERTs
+
+        Returns:
+            list: ids of the objects, in order
+
+        Raises:
+            ValueError: for an unknown class or a missing reference
+        """
+        objs = build_objects(objs, cls)
+        self.__writing()
+        check_references(self, objs)
+        self.__session.add_all(objs)
+        return [obj.id for obj in objs]
+
+    def save_many(self, objs, cls=None):
+        """
+        Adds many objects like new_many() and commits them in a single
+        transaction
+
+        Returns:
+            list: ids of the objects, in order
+        """
+        ids = self.new_many(objs, cls)
+        try:
+            self.__commit()
+        except Exception:
+            self.__rollback()
+            raise
+        return ids
+
+    def delete_many(self, objs):
+        """
+        Deletes objects and, following the foreign keys, the rows that
+        depend on them, with bulk DELETEs in a single transaction
+
+        Returns:
+            int: number of objects deleted
+        """
+        ids = {}
+        for obj in objs:
+            ids.setdefault(type(obj), []).append(obj.id)
+        self.__writing()
+        try:
+            deleted = sum(self.__delete_ids(cls, cls_ids)
+                          for cls, cls_ids in ids.items())
+            self.__commit()
+        except Exception:
+            self.__rollback()
+            raise
+        return deleted
+
+    def truncate(self, cls=None):
+        """
+        Deletes every row of a class (or class name), with its dependents,
+        or of every table, in a single transaction
+
+        Returns:
+            int: number of objects deleted
+        """
+        if isinstance(cls, str):
+            cls = self.classes.get(cls)
+            if cls is None:
+                return 0
+        self.__writing()
+        try:
+            if cls is not None:
+                deleted = self.__delete_ids(cls, [
+                    row[0] for row in self.__session.query(cls.id)])
+            else:
+                deleted = self.count()
+                for table in reversed(Base.metadata.sorted_tables):
+                    self.__session.execute(table.delete())
+                self.__session.expunge_all()
+            self.__commit()
+        except Exception:
+            self.__rollback()
+            raise
+        return deleted
+
+    def __delete_ids(self, cls, ids):
+        """
+        Deletes the rows of cls with the given ids after the rows whose
+        foreign keys point at them, probe_size ids per statement
+
+        Returns:
+            int: number of rows of mapped classes deleted
+        """
+        mapped = {table.__table__: table for table in self.classes.values()}
+        deleted = 0
+        for start in range(0, len(ids), self.probe_size):
+            chunk = ids[start:start + self.probe_size]
+            for table in Base.metadata.sorted_tables:
+                for key in table.foreign_keys:
+                    if key.column.table is not cls.__table__:
+                        continue
+                    if table in mapped:
+                        child = mapped[table]
+                        deleted += self.__delete_ids(child, [
+                            row[0] for row in self.__session.query(
+                                child.id).filter(key.parent.in_(chunk))])
+                    else:
+                        self.__session.execute(
+                            table.delete().where(key.parent.in_(chunk)))
+            deleted += self.__session.query(cls).filter(
+                cls.id.in_(chunk)).delete(synchronize_session="fetch")
+        return deleted
+
     def save(self):
         """
         Saves current session
+
+        Inside transaction() the changes are only flushed; the commit
+        happens at the end of the outermost block.
+        """
+        self.__commit()
+
+    @contextmanager
+    def transaction(self):
         """
-        self.__session.commit()
+        Groups changes into one unit of work
+
+        The outermost block commits once at its end and rolls the session
+        back if it raises; a nested block runs in a SAVEPOINT, so raising
+        in it only undoes its own changes. The exception propagates.
+        """
+        session = self.__session()
+        # open blocks are kept per session, as the session is per thread
+        blocks = session.info.setdefault("blocks", [])
+        if blocks:
+            savepoint = session.begin_nested()
+        else:
+            # keeps every statement of the block on the primary
+            savepoint = None
+            session.info["writing"] = True
+        blocks.append(savepoint)
+        try:
+            yield self
+        except BaseException:
+            blocks.pop()
+            if savepoint is not None:
+                savepoint.rollback()
+            else:
+                session.rollback()
+            raise
+        blocks.pop()
+        if savepoint is not None:
+            savepoint.commit()
+        else:
+            session.commit()
+
+    def __depth(self):
+        """
+        Returns the number of transaction() blocks open in this thread's
+        session
+        """
+        return len(self.__session().info.get("blocks", ()))
+
+    def __writing(self):
+        """
+        Keeps the session on the primary until its transaction ends, so
+        the reads deciding a write do not see a lagging replica
+        """
+        self.__session().info["writing"] = True
+
+    def __commit(self):
+        """
+        Commits, or only flushes inside a transaction() block
+        """
+        if self.__depth():
+            self.__session.flush()
+        else:
+            self.__session.commit()
+
+    def __rollback(self):
+        """
+        Rolls back after a failed bulk operation, unless a transaction()
+        block is open and will roll back itself
+        """
+        if not self.__depth():
+            self.__session.rollback()
 
     def delete(self, obj=None):
         """
@@ -100,9 +669,18 @@ class DBStorage:
         """
         Reloads objects from the database
         """
+        if self.__session is not None:
+            # ends the old session's transaction before replacing it
+            self.__session.remove()
         Base.metadata.create_all(self.__engine)
-        session_builder = sessionmaker(
-            bind=self.__engine, expire_on_commit=False)
+        if self.__router is None:
+            session_builder = sessionmaker(
+                bind=self.__engine, expire_on_commit=False)
+        else:
+            session_builder = sessionmaker(
+                class_=RoutingSession, router=self.__router,
+                bind=self.__engine, expire_on_commit=False)
+            self.__router.watch(session_builder)
         self.__session = scoped_session(session_builder)
 
     def close(self):
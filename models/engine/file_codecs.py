@@ -0,0 +1,350 @@
+#!/usr/bin/python3
+"""
+This module contains the serialization codecs used by FileStorage.
+
+A codec turns the dictionaries produced by BaseModel.to_dict() into the
+bytes of a storage file and back. FileStorage caches one "fragment" per
+object, in whatever form the codec finds cheapest to write out again.
+
+Usage (convert a store between formats):
+    python3 -m models.engine.file_codecs <src codec> <src> <dst codec> <dst>
+"""
+import json
+import struct
+import sys
+from array import array
+from models.engine import timestamps
+
+
+class JSONCodec:
+    """
+    Codec for the original file.json format: one JSON object mapping
+    <class name>.id to each object's dictionary
+
+    Fragments are the JSON text of each dictionary.
+
+    Attributes:
+        name (str):         codec name
+        extension (str):    default file extension
+    """
+    name = "json"
+    extension = ".json"
+
+    def encode(self, record):
+        """
+        Returns the fragment cached for an object dictionary
+        """
+        return json.dumps(record)
+
+    def decode(self, fragment):
+        """
+        Returns a new object dictionary from a fragment
+        """
+        return json.loads(fragment)
+
+    def to_json(self, fragment):
+        """
+        Returns the JSON text of a fragment (used for journal records)
+        """
+        return fragment
+
+    def dumps(self, fragments):
+        """
+        Returns the file contents for a key -> fragment mapping
+        """
+        return ("{" + ", ".join(
+            "{}: {}".format(json.dumps(key), value)
+            for key, value in fragments.items()) + "}").encode("utf-8")
+
+    def loads(self, data):
+        """
+        Returns the key -> object dictionary mapping stored in data
+        """
+        return json.loads(data) if data else {}
+
+
+class BinaryCodec:
+    """
+    Compact columnar codec
+
+    Objects are grouped by class into tables with one column per
+    attribute, so attribute names are stored once per class. All strings
+    are interned into a single string table, created_at and updated_at are
+    stored as integer microseconds since the epoch, and each column is a
+    run of one-byte type tags followed by packed 64-bit integer and float
+    arrays.
+
+    Fragments are the object dictionaries themselves.
+
+    Attributes:
+        name (str):         codec name
+        extension (str):    default file extension
+        magic (bytes):      file signature
+    """
+    name = "binary"
+    extension = ".hbnb"
+    magic = b"HBNBC\x01\n"
+
+    ABSENT, NONE, STR, INT, FLOAT, TRUE, FALSE, TIME, JSON = range(9)
+    TIME_FIELDS = ("created_at", "updated_at")
+
+    def encode(self, record):
+        """
+        Returns the fragment cached for an object dictionary
+        """
+        return self.__copy(record)
+
+    def decode(self, fragment):
+        """
+        Returns a new object dictionary from a fragment
+        """
+        return self.__copy(fragment)
+
+    @classmethod
+    def __copy(cls, value):
+        """
+        Returns a copy of value whose lists and dictionaries are copied
+        too, so that fragments and objects never share them
+        """
+        if isinstance(value, dict):
+            return {key: cls.__copy(item) if isinstance(item, (dict, list))
+                    else item for key, item in value.items()}
+        return [cls.__copy(item) if isinstance(item, (dict, list))
+                else item for item in value]
+
+    def to_json(self, fragment):
+        """
+        Returns the JSON text of a fragment (used for journal records)
+        """
+        return json.dumps(fragment)
+
+    def dumps(self, fragments):
+        """
+        Returns the file contents for a key -> fragment mapping
+        """
+        strings, interned = [], {}
+
+        def intern(value):
+            """
+            Returns the string table index of value
+            """
+            index = interned.get(value)
+            if index is None:
+                index = interned[value] = len(strings)
+                strings.append(value)
+            return index
+
+        tables = {}
+        for record in fragments.values():
+            tables.setdefault(record.get("__class__"), []).append(record)
+
+        body = [struct.pack("<I", len(tables))]
+        for class_name, rows in tables.items():
+            fields = {}
+            for record in rows:
+                for field in record:
+                    if field != "__class__":
+                        fields[field] = None
+            body.append(struct.pack("<III", intern(class_name), len(rows),
+                                    len(fields)))
+            body.append(self.__pack_ints([intern(f) for f in fields]))
+            for field in fields:
+                body.extend(self.__dump_column(field, rows, intern))
+
+        lengths = array("q", [len(value) for value in strings])
+        blob = "".join(strings).encode("utf-8")
+        head = [self.magic, struct.pack("<I", len(strings)),
+                self.__pack(lengths), struct.pack("<Q", len(blob)), blob]
+        return b"".join(head + body)
+
+    def __dump_column(self, field, rows, intern):
+        """
+        Returns the byte chunks of one column
+        """
+        tags, ints, floats = bytearray(), array("q"), array("d")
+        timed = field in self.TIME_FIELDS
+        absent = object()
+        for record in rows:
+            value = record.get(field, absent)
+            if value is absent:
+                tags.append(self.ABSENT)
+            elif value is None:
+                tags.append(self.NONE)
+            elif value is True:
+                tags.append(self.TRUE)
+            elif value is False:
+                tags.append(self.FALSE)
+            elif isinstance(value, str):
+                micros = timestamps.to_micros(value) if timed else None
+                if micros is None:
+                    tags.append(self.STR)
+                    ints.append(intern(value))
+                else:
+                    tags.append(self.TIME)
+                    ints.append(micros)
+            elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+                tags.append(self.INT)
+                ints.append(value)
+            elif isinstance(value, float):
+                tags.append(self.FLOAT)
+                floats.append(value)
+            else:
+                tags.append(self.JSON)
+                ints.append(intern(json.dumps(value)))
+        return [bytes(tags), struct.pack("<II", len(ints), len(floats)),
+                self.__pack(ints), self.__pack(floats)]
+
+    def loads(self, data):
+        """
+        Returns the key -> object dictionary mapping stored in data
+        """
+        if not data:
+            return {}
+        if not data.startswith(self.magic):
+            raise ValueError("not a binary HBNB store")
+        view = memoryview(data)
+        offset = len(self.magic)
+        count, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        lengths, offset = self.__unpack("q", view, offset, count)
+        size, = struct.unpack_from("<Q", data, offset)
+        offset += 8
+        text = bytes(view[offset:offset + size]).decode("utf-8")
+        offset += size
+        strings, start = [], 0
+        for length in lengths:
+            strings.append(text[start:start + length])
+            start += length
+
+        obj_dict = {}
+        tables, = struct.unpack_from("<I", data, offset)
+        offset += 4
+        for _ in range(tables):
+            name, rows, width = struct.unpack_from("<III", data, offset)
+            offset += 12
+            class_name = strings[name]
+            field_ids, offset = self.__unpack("q", view, offset, width)
+            records = [{} for _ in range(rows)]
+            for field_id in field_ids:
+                offset = self.__load_column(strings[field_id], records,
+                                            strings, view, offset)
+            for record in records:
+                record["__class__"] = class_name
+                obj_dict["{}.{}".format(class_name, record.get("id"))] = \
+                    record
+        return obj_dict
+
+    def __load_column(self, field, records, strings, view, offset):
+        """
+        Fills one column into records and returns the next offset
+        """
+        tags = bytes(view[offset:offset + len(records)])
+        offset += len(records)
+        n_ints, n_floats = struct.unpack_from("<II", view, offset)
+        offset += 8
+        ints, offset = self.__unpack("q", view, offset, n_ints)
+        floats, offset = self.__unpack("d", view, offset, n_floats)
+        if tags.count(self.STR) == len(records):
+            for record, index in zip(records, ints):
+                record[field] = strings[index]
+            return offset
+        if tags.count(self.TIME) == len(records):
+            from_micros = timestamps.from_micros
+            for record, micros in zip(records, ints):
+                record[field] = from_micros(micros)
+            return offset
+        ints, floats = iter(ints), iter(floats)
+        constants = {self.NONE: None, self.TRUE: True, self.FALSE: False}
+        for record, tag in zip(records, tags):
+            if tag == self.STR:
+                record[field] = strings[next(ints)]
+            elif tag == self.TIME:
+                record[field] = timestamps.from_micros(next(ints))
+            elif tag == self.INT:
+                record[field] = next(ints)
+            elif tag == self.FLOAT:
+                record[field] = next(floats)
+            elif tag == self.JSON:
+                record[field] = json.loads(strings[next(ints)])
+            elif tag != self.ABSENT:
+                record[field] = constants[tag]
+        return offset
+
+    @staticmethod
+    def __pack(values):
+        """
+        Returns a numeric array as little-endian bytes
+        """
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        return values.tobytes()
+
+    def __pack_ints(self, values):
+        """
+        Returns a list of integers as little-endian bytes
+        """
+        return self.__pack(array("q", values))
+
+    @staticmethod
+    def __unpack(typecode, view, offset, count):
+        """
+        Reads count little-endian numbers and returns them with the next
+        offset
+        """
+        values = array(typecode)
+        end = offset + count * values.itemsize
+        values.frombytes(view[offset:end])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values, end
+
+
+codecs = {
+    JSONCodec.name: JSONCodec,
+    BinaryCodec.name: BinaryCodec,
+}
+
+
+def get_codec(name=None):
+    """
+    Returns a codec instance by name (default: json)
+
+    Raises:
+        ValueError: if there is no codec with that name
+    """
+    if name is None or name == "":
+        name = JSONCodec.name
+    if name not in codecs:
+        raise ValueError("unknown storage codec: {}".format(name))
+    return codecs[name]()
+
+
+def convert(src_path, dst_path, src_codec="json", dst_codec="binary"):
+    """
+    Converts a storage file from one codec to another
+
+    Args:
+        src_path (str):     file to read
+        dst_path (str):     file to write
+        src_codec (str):    codec of the source file
+        dst_codec (str):    codec of the destination file
+
+    Returns:
+        int: number of objects converted
+    """
+    reader, writer = get_codec(src_codec), get_codec(dst_codec)
+    with open(src_path, "rb") as file:
+        obj_dict = reader.loads(file.read())
+    with open(dst_path, "wb") as file:
+        file.write(writer.dumps({key: writer.encode(value)
+                                 for key, value in obj_dict.items()}))
+    return len(obj_dict)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print("Usage: {} <src codec> <src> <dst codec> <dst>".format(
+            sys.argv[0]))
+        sys.exit(1)
+    print(convert(sys.argv[2], sys.argv[4], sys.argv[1], sys.argv[3]))
@@ -3,10 +3,21 @@
 This module contains the FileStorage class.
 """
 import models
+import atexit
 import json
 import importlib
-from datetime import datetime
-from models.base_model import BaseModel
+import os
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from models.engine.journal import Journal
+from models.engine.file_codecs import get_codec
+from models.engine.shards import Shards
+from models.engine import timestamps
+from models.engine import query
+from models.base_model import BaseModel, hold, copy_state, restore_state
 from models.user import User
 from models.place import Place
 from models.state import State
@@ -24,93 +35,1323 @@ classes = {
     "Review": Review,
 }
 
+# attributes holding the ids of other objects, and the class of those
+# objects; indexed by FileStorage and checked by check_references()
+references = {
+    "City": {"state_id": "State"},
+    "Place": {"city_id": "City", "user_id": "User",
+              "amenity_ids": "Amenity"},
+    "Review": {"place_id": "Place", "user_id": "User"},
+}
+
+
+def env_flag(name):
+    """
+    Returns True if the environment variable is set to 1, true or yes
+    """
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+def build_objects(objs, cls=None):
+    """
+    Returns model instances for an iterable of instances or dictionaries
+
+    A dictionary is built as cls, or as the class named by its
+    "__class__" key. Instances without an id are given one, so bulk
+    writers can return ids without a round trip; timestamp strings are
+    parsed for database-mapped classes.
+
+    Raises:
+        ValueError: for a dictionary whose class is unknown
+    """
+    if isinstance(cls, str):
+        cls = classes.get(cls)
+    built = []
+    for obj in objs:
+        if isinstance(obj, dict):
+            value = dict(obj)
+            model = cls or classes.get(value.pop("__class__", None))
+            value.pop("__class__", None)
+            if model is None:
+                raise ValueError("unknown class for {}".format(obj))
+            if hasattr(model, "__table__"):
+                for name in ("created_at", "updated_at"):
+                    if isinstance(value.get(name), str):
+                        value[name] = timestamps.parse(value[name])
+            obj = model(**value)
+        if getattr(obj, "id", None) is None:
+            obj.id = str(uuid.uuid4())
+        built.append(obj)
+    return built
+
+
+def select_columns(source, names):
+    """
+    Returns {name: value} for the listed attributes of an object or of a
+    stored dictionary, always with "id" first; timestamps read from a
+    dictionary are parsed, and missing attributes are None
+    """
+    names = ["id"] + [name for name in names if name != "id"]
+    if not isinstance(source, dict):
+        return {name: getattr(source, name, None) for name in names}
+    row = {name: source.get(name) for name in names}
+    for name in ("created_at", "updated_at"):
+        if isinstance(row.get(name), str):
+            row[name] = timestamps.parse(row[name])
+    return row
+
+
+def dependents(class_name):
+    """
+    Returns the (class name, attribute) pairs of references pointing at
+    objects of a class
+    """
+    return [(child, name) for child, names in references.items()
+            for name, parent in names.items() if parent == class_name]
+
+
+def cascade(storage, objs):
+    """
+    Returns objs and every stored object depending on them, following
+    references the way the database relationships cascade: a State takes
+    its Cities, a City or User its Places, a Place or User its Reviews
+
+    Ids of deleted objects are removed from the list references of the
+    objects that remain (Place.amenity_ids), which are re-added to
+    storage so the next save writes them.
+    """
+    found, lists = {}, []
+    queue = list(objs)
+    while queue:
+        obj = queue.pop()
+        key = "{}.{}".format(obj.__class__.__name__, obj.id)
+        if key in found:
+            continue
+        found[key] = obj
+        for child, name in dependents(obj.__class__.__name__):
+            for dependent in storage.children(child, name, obj.id):
+                if isinstance(getattr(dependent, name, None), list):
+                    lists.append((dependent, name, obj.id))
+                else:
+                    queue.append(dependent)
+    for dependent, name, ref in lists:
+        if "{}.{}".format(dependent.__class__.__name__,
+                          dependent.id) not in found:
+            setattr(dependent, name, [value for value in
+                                      getattr(dependent, name)
+                                      if value != ref])
+            storage.new(dependent)
+    return list(found.values())
+
+
+def check_references(storage, objs):
+    """
+    Checks that every id an object refers to (see references) is stored
+    or belongs to another object of objs, with one storage.missing()
+    call per referenced class
+
+    Raises:
+        ValueError: naming the ids that were not found
+    """
+    batch, wanted = {}, {}
+    for obj in objs:
+        class_name = obj.__class__.__name__
+        batch.setdefault(class_name, set()).add(obj.id)
+        for name, parent in references.get(class_name, {}).items():
+            value = getattr(obj, name, None)
+            if not isinstance(value, (list, tuple, set, frozenset)):
+                value = () if value is None else (value,)
+            wanted.setdefault(parent, set()).update(value)
+    for parent, ids in wanted.items():
+        missing = storage.missing(parent, ids - batch.get(parent, set()))
+        if missing:
+            raise ValueError("{} not found: {}".format(
+                parent, ", ".join(sorted(missing))))
+
 
 class FileStorage:
     """
     Serializes/deserializes objects to/from JSON file
 
+    In journal mode (HBNB_FILE_JOURNAL=1), save() appends only the
+    changed objects to a log next to the JSON file, and the log is folded
+    back into the JSON file by a background compaction once it grows.
+
+    In lazy mode (HBNB_FILE_LAZY=1), reload() only keeps the JSON of each
+    record; objects are built the first time their class is requested.
+
+    The file format is chosen by HBNB_FILE_CODEC: "json" (default) or
+    "binary", a compact columnar format stored in file.hbnb.
+
+    With HBNB_FILE_LAYOUT=sharded, objects are kept in a directory with
+    one file per class (see models.engine.shards) instead of a single
+    file, and save() only rewrites the files holding changed objects.
+
+    In write-behind mode (HBNB_FILE_WRITE_BEHIND=<milliseconds>), save()
+    only records that the store has changes and returns; a background
+    thread writes them all at once every interval, or as soon as
+    HBNB_FILE_FLUSH_EVERY changes are waiting. Pending changes are also
+    written by flush(), sync() and at interpreter exit.
+
     Attributes:
         __file_path (str):      path to JSON file
         __objects (dict):       dictionary to store objects
+        __by_class (dict):      per-class buckets of __objects
+        __journal (Journal):    change log, or None outside journal mode
+        __codec (object):       file format (see models.engine.file_codecs)
+        __persisted (dict):     key -> fragment last written for each object
+        __shards (Shards):      sharded layout, or None for a single file
+        __shard_keys (dict):    shard name -> keys stored in that shard
+        __pending (dict):       class name -> keys not yet built (lazy mode)
+        __updated (dict):       class name -> key -> stored updated_at of
+                                each live object, built or not
+        __latest (dict):        class name -> latest of __updated, dropped
+                                when it has to be found again
+        __refs (dict):          (class name, attribute) -> referenced id ->
+                                keys of the objects referencing it
+        __ref_ids (dict):       key -> attribute -> ids indexed for it
+        __bitmaps (dict):       (class name, list attribute) -> id ->
+                                bitmap of the slots of objects holding it
+        __slots (dict):         key -> bitmap slot number
+        __transactions (dict):  thread id -> open transaction() blocks
+                                of that thread, innermost last
+        __interval (float):     seconds between write-behind flushes, or
+                                None when save() writes at once
+        __flush_every (int):    changes that trigger an early flush
+        compact_min (int):      journal records before compaction is due
+        compact_ratio (float):  journal records per object before compaction
 
     Methods:
-        all(self, cls=None):    returns list of objects
+        all(self, cls=None, load=None, columns=None): returns objects
+                                (or some of their columns)
+        get(self, cls, id):     returns one object by class and id
+        exists(self, cls, id):  checks if an object is stored
+        children(self, cls, name, id): returns objects referencing an id
+        having(self, cls, name, ids): returns objects holding all ids
+        iter(self, cls=None, batch_size=1000): yields stored objects
+        new_many(self, objs, cls=None): adds many objects at once
+        save_many(self, objs, cls=None): adds and saves many objects
+        delete_many(self, objs): deletes objects and their dependents
+        truncate(self, cls=None): deletes every object (of a class)
+        transaction(self):      defers saves, rolls back on error
+        find(self, cls, ...):   returns objects matching criteria
+        explain(self, cls, ...): describes how find() would run
+        missing(self, cls, ids): returns the ids not stored
+        count(self, cls=None):  returns the number of objects
+        stats(self):            returns per-class counts and last update
         new(self, obj):         adds object to storage dictionary
         save(self):             serializes __objects to JSON file
+        flush(self):            writes pending changes now
+        sync(self):             writes pending changes and fsyncs them
         reload(self):           deserializes JSON file to __objects
         delete(self, obj=None): deletes object from storage
+        compact(self):          folds the journal into the JSON file
         key_create(self, obj):  creates key
     """
     __file_path = 'file.json'
     __objects = {}
+    __by_class = {}
+    compact_min = 1000
+    compact_ratio = 1.0
+    flush_every = 1000
 
-    def all(self, cls=None):
+    def __init__(self, file_path=None, journal=None, lazy=None,
+                 codec=None, layout=None, shards=None, write_behind=None,
+                 flush_every=None):
+        """
+        Initializes an empty storage
+
+        Args:
+            file_path (str):    path to JSON file (default: file.json)
+            journal (bool):     enables journal mode (default: from
+                                HBNB_FILE_JOURNAL)
+            lazy (bool):        enables lazy mode (default: from
+                                HBNB_FILE_LAZY)
+            codec (str):        file format (default: from HBNB_FILE_CODEC)
+            layout (str):       "single" or "sharded" (default: from
+                                HBNB_FILE_LAYOUT)
+            shards (dict):      class name -> hash shards per class, "*"
+                                for every class (default: from
+                                HBNB_FILE_SHARDS)
+            write_behind (int): milliseconds between background flushes,
+                                0 to write on every save (default: from
+                                HBNB_FILE_WRITE_BEHIND)
+            flush_every (int):  pending changes that trigger an early
+                                background flush (default: from
+                                HBNB_FILE_FLUSH_EVERY)
+
+        Raises:
+            ValueError: for an unknown codec or layout, or for journal mode
+                        combined with the sharded layout
+        """
+        self.__codec = get_codec(
+            codec if codec is not None else os.getenv("HBNB_FILE_CODEC"))
+        if file_path is not None:
+            self.__file_path = file_path
+        elif self.__codec.name != "json":
+            self.__file_path = "file" + self.__codec.extension
+        if journal is None:
+            journal = env_flag("HBNB_FILE_JOURNAL")
+        if lazy is None:
+            lazy = env_flag("HBNB_FILE_LAZY")
+        if layout is None:
+            layout = os.getenv("HBNB_FILE_LAYOUT") or "single"
+        if layout not in ("single", "sharded"):
+            raise ValueError("unknown storage layout: {}".format(layout))
+        if layout == "sharded" and journal:
+            raise ValueError("journal mode needs the single-file layout")
+        if shards is None:
+            shards = Shards.parse(os.getenv("HBNB_FILE_SHARDS"))
+        self.__shards = Shards(os.path.splitext(self.__file_path)[0],
+                               self.__codec.extension, shards) \
+            if layout == "sharded" else None
+        self.__shard_keys = {}
+        self.__rewrite = set()
+        self.__stale = set()
+        self.__lazy = lazy
+        self.__pending = {}
+        self.__updated = {}
+        self.__latest = {}
+        self.__objects = {}
+        self.__by_class = {}
+        self.__persisted = {}
+        self.__dirty = set()
+        self.__deleted = set()
+        self.__refs = {}
+        self.__ref_ids = {}
+        self.__bitmaps = {}
+        self.__slots = {}
+        self.__slot_keys = []
+        self.__free_slots = []
+        self.__transactions = {}
+        self.__journal = Journal(self.__file_path + ".journal") \
+            if journal else None
+        self.__lock = threading.RLock()
+        self.__compacting = threading.Lock()
+        self.__compactor = None
+        self.__stamp = None
+        if write_behind is None:
+            write_behind = int(os.getenv("HBNB_FILE_WRITE_BEHIND") or 0)
+        if flush_every is None:
+            flush_every = int(os.getenv("HBNB_FILE_FLUSH_EVERY") or
+                              self.flush_every)
+        self.__interval = write_behind / 1000 if write_behind > 0 else None
+        self.__flush_every = flush_every
+        self.__unsaved = False
+        self.__wake = threading.Event()
+        self.__flusher = None
+        # held by the objects of this storage, so that it is told when
+        # they change without them keeping it alive
+        self.__ref = weakref.ref(self)
+
+    def all(self, cls=None, load=None, columns=None):
         """
         Returns list of objects
+
+        Without a class this is the live __objects dictionary, so a
+        caller deleting objects has to iterate over a list of it. With a
+        class (or class name), it is a copy of that class's bucket, made
+        instead of scanning every stored object, that deletes leave as
+        it was. load is accepted for compatibility with DBStorage and
+        ignored: related objects are found through the reverse indexes,
+        one lookup each.
+
+        With columns, returns key -> {"id": ..., column: value} instead
+        (see select_columns()); in lazy mode objects not built yet are
+        read from their stored fragments and stay unbuilt.
         """
+        if columns is not None:
+            return self.__columns(cls, columns)
         if cls is not None:
-            if isinstance(cls, str):
-                if cls in classes:
-                    cls = classes[cls]
-            class_objects = {}
-            for key, value in self.__objects.items():
-                if key.find(cls.__name__) == 0:
-                    class_objects.update({key: value})
-            return class_objects
+            if not isinstance(cls, str):
+                cls = cls.__name__
+            if self.__pending.get(cls):
+                self.__hydrate(cls)
+            with self.__lock:
+                return dict(self.__by_class.get(cls, {}))
+        for name in list(self.__pending):
+            if self.__pending[name]:
+                self.__hydrate(name)
         return self.__objects
 
+    def __columns(self, cls, columns):
+        """
+        Returns the rows of all(columns=...)
+        """
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        rows = {}
+        with self.__lock:
+            for class_name, keys in self.__pending.items():
+                if cls is None or class_name == cls:
+                    for key in keys:
+                        rows[key] = select_columns(self.__codec.decode(
+                            self.__persisted[key]), columns)
+            objects = self.__objects if cls is None else \
+                self.__by_class.get(cls, {})
+            for key, obj in objects.items():
+                rows[key] = select_columns(obj, columns)
+        return rows
+
+    def get(self, cls, id, load=None):
+        """
+        Returns the object of a class (or class name) with the given id,
+        or None
+
+        The key is looked up directly; in lazy mode only that object is
+        built, not its whole class. load is ignored, as in all().
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        key = "{}.{}".format(cls, id)
+        obj = self.__objects.get(key)
+        if obj is None and key in self.__pending.get(cls, ()):
+            with self.__lock:
+                if key in self.__pending.get(cls, ()):
+                    self.__pending[cls].discard(key)
+                    obj = self.__build(
+                        key, self.__codec.decode(self.__persisted[key]))
+                else:
+                    obj = self.__objects.get(key)
+        return obj
+
+    def exists(self, cls, id):
+        """
+        Checks if an object of a class (or class name) with the given id
+        is stored, without building it in lazy mode
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        key = "{}.{}".format(cls, id)
+        return key in self.__objects or key in self.__pending.get(cls, ())
+
+    def missing(self, cls, ids):
+        """
+        Returns the set of ids with no stored object of a class (or class
+        name), to validate many references at once
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        bucket = self.__by_class.get(cls, {})
+        pending = self.__pending.get(cls, ())
+        prefix = cls + "."
+        return {id for id in ids
+                if prefix + str(id) not in bucket and
+                prefix + str(id) not in pending}
+
+    def count(self, cls=None):
+        """
+        Returns the number of objects of a class (or class name), or of
+        all objects, from the bucket sizes; lazy mode builds nothing
+        """
+        if cls is None:
+            return len(self.__objects) + sum(
+                len(keys) for keys in self.__pending.values())
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        return len(self.__by_class.get(cls, ())) + \
+            len(self.__pending.get(cls, ()))
+
+    def stats(self):
+        """
+        Returns class name -> {"count": number of objects, "updated_at":
+        latest updated_at or None} for every class
+
+        The latest timestamps are kept up to date as objects are added,
+        changed, read and deleted, as stored strings, so nothing is
+        decoded or built here.
+        """
+        stats = {}
+        with self.__lock:
+            for class_name in classes:
+                if class_name not in self.__latest:
+                    self.__latest[class_name] = max(filter(
+                        None, self.__updated.get(class_name, {}).values()),
+                        default=None)
+                latest = self.__latest[class_name]
+                stats[class_name] = {
+                    "count": self.count(class_name),
+                    "updated_at": latest and timestamps.parse(latest)}
+        return stats
+
+    def iter(self, cls=None, batch_size=1000):
+        """
+        Yields the objects of a class (or class name), or every object,
+        class by class
+
+        Keys are taken batch_size at a time, so in lazy mode objects are
+        built as the iteration reaches them rather than a class at a time.
+        """
+        if cls is None:
+            names = list(dict.fromkeys(list(self.__by_class) +
+                                       list(self.__pending)))
+        else:
+            names = [cls if isinstance(cls, str) else cls.__name__]
+        for name in names:
+            keys = list(self.__by_class.get(name, {})) + \
+                list(self.__pending.get(name, ()))
+            for start in range(0, len(keys), batch_size):
+                for key in keys[start:start + batch_size]:
+                    obj = self.get(name, key.partition(".")[2])
+                    if obj is not None:
+                        yield obj
+
     def new(self, obj):
         """
         Adds object to storage dictionary (<class name>.id)
         """
         key = obj.__class__.__name__ + "." + obj.id
-        self.__objects[key] = obj
+        hold(obj, self.__ref)
+        with self.__lock:
+            self.__objects[key] = obj
+            self.__by_class.setdefault(obj.__class__.__name__, {})[key] = obj
+            self.__pending.get(obj.__class__.__name__, set()).discard(key)
+            self.__dirty.add(key)
+            self.__deleted.discard(key)
+            self.__index(key, obj)
+            self.__restamp(key, obj)
+            self.__touch(key, obj)
+
+    def new_many(self, objs, cls=None):
+        """
+        Adds many objects (instances, or dictionaries built as cls or
+        their "__class__") after checking all their references at once
+
+        Returns:
+            list: ids of the objects, in order
+
+        Raises:
+            ValueError: for an unknown class or a missing reference
+        """
+        objs = build_objects(objs, cls)
+        with self.__lock:
+            check_references(self, objs)
+            for obj in objs:
+                self.new(obj)
+        return [obj.id for obj in objs]
+
+    def save_many(self, objs, cls=None):
+        """
+        Adds many objects like new_many() and writes them with a single
+        save()
+
+        Returns:
+            list: ids of the objects, in order
+        """
+        ids = self.new_many(objs, cls)
+        self.save()
+        return ids
 
     def save(self):
         """
         Serializes __objects to JSON file
 
-        Attributes:
-            obj_dict (dict):  dictionary to store objects
+        Only objects marked dirty since the last save are re-encoded; the
+        rest reuse the JSON cached for them. In journal mode only the dirty
+        and deleted objects are written at all.
+
+        In write-behind mode the write is left to the background flusher,
+        and inside transaction() to the end of the calling thread's
+        outermost block.
+        """
+        if threading.get_ident() in self.__transactions:
+            return
+        if self.__interval is None:
+            self.flush()
+            return
+        with self.__lock:
+            self.__unsaved = True
+            if self.__flusher is None:
+                # the flusher and atexit only hold weak references, so
+                # that the storage can still be collected
+                self.__flusher = threading.Thread(
+                    target=self.__flush_loop,
+                    args=(self.__ref, self.__wake, self.__interval),
+                    daemon=True)
+                self.__flusher.start()
+                atexit.register(self.__flush_at_exit, self.__ref)
+            if len(self.__dirty) + len(self.__deleted) >= \
+                    self.__flush_every:
+                self.__wake.set()
+
+    def flush(self):
+        """
+        Writes the changes made since the last write
+
+        In journal mode the journal's writer lock is taken first, as in
+        compact(), so that appends from other processes do not interleave.
+        """
+        journal = self.__journal
+        with journal.lock() if journal is not None else nullcontext(), \
+                self.__lock:
+            self.__unsaved = False
+            puts = {}
+            for key in self.__dirty:
+                obj = self.__objects.get(key)
+                if obj is not None:
+                    puts[key] = self.__codec.encode(obj.to_dict())
+            dels = [key for key in self.__deleted if key in self.__persisted]
+            self.__dirty.clear()
+            self.__deleted.clear()
+            self.__persisted.update(puts)
+            for key in dels:
+                del self.__persisted[key]
+            if self.__shards is not None:
+                self.__write_shards(puts, dels)
+                return
+            if self.__journal is None:
+                self.__write_snapshot(self.__persisted)
+                self.__stamp = self.__stamp_files()
+                return
+            caught_up = self.__journal.append(
+                {key: self.__codec.to_json(value)
+                 for key, value in puts.items()}, dels)
+            stamp = self.__stamp_files()
+            # only when nothing written by others is left unread: neither
+            # journal records nor a snapshot compacted since the last read
+            if caught_up and self.__stamp is not None and \
+                    stamp[0] == self.__stamp[0]:
+                self.__stamp = stamp
+        if self.__journal.records > max(
+                self.compact_min, self.compact_ratio *
+                len(self.__objects)) or self.__journal.pending():
+            self.__compact_later()
+
+    def sync(self):
+        """
+        Writes pending changes and forces the store files to disk
+        """
+        self.flush()
+        with self.__lock:
+            if self.__shards is not None:
+                paths = [self.__shards.path(name)
+                         for name in self.__shards.stamp()]
+                directory = self.__shards.directory
+            else:
+                paths = [self.__file_path]
+                if self.__journal is not None:
+                    paths.append(self.__journal.path)
+                directory = os.path.dirname(self.__file_path) or "."
+            for path in paths + [directory]:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    continue
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+    @staticmethod
+    def __flush_loop(ref, wake, interval):
+        """
+        Background flusher: writes saved changes every interval, or
+        sooner when save() finds enough of them waiting, until the
+        storage is collected
+        """
+        while True:
+            wake.wait(interval)
+            wake.clear()
+            storage = ref()
+            if storage is None:
+                return
+            storage.__flush_pending()
+            del storage
+
+    @staticmethod
+    def __flush_at_exit(ref):
+        """
+        Writes the changes still waiting for the flusher at exit
+        """
+        storage = ref()
+        if storage is not None:
+            storage.__flush_pending()
+
+    def __flush_pending(self):
+        """
+        Flushes if save() was called since the last write
+        """
+        if self.__unsaved:
+            self.flush()
+
+    def __del__(self):
+        """
+        Writes the changes still waiting for the flusher when the
+        storage is collected
+        """
+        if self.__dict__.get("_FileStorage__unsaved"):
+            self.flush()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups changes into one unit of work
+
+        save() calls inside the block are deferred to a single save() at
+        the end of the outermost block. If the block raises, every object
+        added, changed or deleted inside it is put back as it was when the
+        block started, in place, and the exception propagates. Blocks nest;
+        an inner block that raises only undoes its own changes, like a
+        savepoint. Unsaved changes are written when the outermost block
+        starts, so the stored state is what a rollback restores.
+
+        Blocks belong to the thread that opens them: other threads' saves
+        are not deferred, and only changes made by this thread are undone.
+        A save by another thread (or the write-behind flusher) may still
+        write this block's changes early; a rollback then leaves the
+        restored objects dirty, so the next save writes them back.
+        """
+        thread = threading.get_ident()
+        if thread not in self.__transactions and \
+                (self.__dirty or self.__deleted):
+            self.flush()
+        with self.__lock:
+            frames = self.__transactions.get(thread)
+            snapshot = {}
+            if frames is None:
+                frames = self.__transactions[thread] = []
+                stored = {}
+            else:
+                stored = frames[0]["stored"]
+                for frame in frames:
+                    for key, obj in frame["touched"].items():
+                        current = self.__objects.get(key)
+                        snapshot[key] = (obj, copy_state(current)
+                                         if current is not None else None)
+            frame = {"touched": {}, "snapshot": snapshot, "stored": stored}
+            frames.append(frame)
+        try:
+            yield self
+        except BaseException:
+            with self.__lock:
+                self.__pop_frame(thread, frame)
+                self.__rollback(frame, thread not in self.__transactions)
+            raise
+        with self.__lock:
+            self.__pop_frame(thread, frame)
+            if thread in self.__transactions:
+                touched = self.__transactions[thread][-1]["touched"]
+                for key, obj in frame["touched"].items():
+                    touched.setdefault(key, obj)
+        if thread not in self.__transactions:
+            self.save()
+
+    def __pop_frame(self, thread, frame):
+        """
+        Closes a thread's innermost transaction block
         """
-        obj_dict = {}
-        for key, value in self.__objects.items():
-            obj_dict[key] = value.to_dict()
-        with open(self.__file_path, "w", encoding="utf-8") as file:
-            json.dump(obj_dict, file)
+        frames = self.__transactions[thread]
+        frames.remove(frame)
+        if not frames:
+            del self.__transactions[thread]
+
+    def __touch(self, key, obj):
+        """
+        Records an object changed inside a transaction block of the
+        calling thread, with its stored fragment the first time
+        """
+        frames = self.__transactions.get(threading.get_ident())
+        if frames:
+            frames[-1]["touched"].setdefault(key, obj)
+            if key not in frames[0]["stored"]:
+                frames[0]["stored"][key] = self.__persisted.get(key)
+
+    def __rollback(self, frame, outermost):
+        """
+        Puts the objects touched in a transaction block back as they were
+        when it started: from the block's snapshot for objects an outer
+        block had already touched, from the fragment stored when the
+        transaction first touched them otherwise
+        """
+        stored = frame["stored"]
+        for key, obj in frame["touched"].items():
+            if key in frame["snapshot"]:
+                obj, state = frame["snapshot"][key]
+            elif stored.get(key) is not None:
+                state = self.__codec.decode(stored[key])
+                state.pop("__class__", None)
+            else:
+                state = None
+            if state is None:
+                current = self.__objects.get(key)
+                if current is not None:
+                    self.delete(current)
+                continue
+            if obj is None:
+                obj = self.__objects.get(key)
+            if obj is None:
+                obj = self.__build(key, dict(
+                    state, __class__=key.partition(".")[0]))
+            else:
+                restore_state(obj, state)
+            self.new(obj)
+        if outermost:
+            # objects whose stored fragment did not change meanwhile are
+            # back to the stored state, so there is nothing left to write
+            unchanged = [key for key in frame["touched"]
+                         if self.__persisted.get(key) == stored.get(key)]
+            self.__dirty.difference_update(unchanged)
+            self.__deleted.difference_update(unchanged)
+
+    def mark_dirty(self, obj, name=None):
+        """
+        Flags a stored object for re-encoding on the next save
+
+        Called by BaseModel whenever an attribute of an object this
+        storage holds is assigned.
+
+        Args:
+            obj (BaseModel):    modified object
+            name (str):         name of the modified attribute
+        """
+        obj_id = obj.__dict__.get("id")
+        if obj_id is None:
+            return
+        key = obj.__class__.__name__ + "." + obj_id
+        if self.__objects.get(key) is obj:
+            with self.__lock:
+                self.__dirty.add(key)
+                self.__touch(key, obj)
+                if name in (None, "updated_at"):
+                    self.__restamp(key, obj)
+                names = references.get(obj.__class__.__name__, ())
+                if name is None or name in names:
+                    self.__index(key, obj, names if name is None else
+                                 (name,))
+
+    def children(self, cls, name, id):
+        """
+        Returns the objects of a class (or class name) whose attribute
+        name holds the given id, e.g. children("City", "state_id", id)
+
+        Attributes listed in references are answered from the reverse
+        index; any other attribute falls back to a scan of the class.
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        if self.__pending.get(cls):
+            self.__hydrate(cls)
+        if name not in references.get(cls, ()):
+            return [obj for obj in self.__by_class.get(cls, {}).values()
+                    if getattr(obj, name, None) == id]
+        keys = self.__refs.get((cls, name), {}).get(id, ())
+        return [self.__objects[key] for key in keys if key in self.__objects]
+
+    def having(self, cls, name, ids):
+        """
+        Returns the objects of a class (or class name) whose list
+        attribute name holds every one of the given ids, e.g.
+        having("Place", "amenity_ids", [wifi.id, pool.id])
+
+        List attributes listed in references keep one bitmap per id, so
+        this is an intersection of bitmaps; other attributes fall back to
+        a scan of the class.
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        if self.__pending.get(cls):
+            self.__hydrate(cls)
+        ids = set(ids)
+        if name not in references.get(cls, ()):
+            return [obj for obj in self.__by_class.get(cls, {}).values()
+                    if ids.issubset(getattr(obj, name, None) or ())]
+        if not ids:
+            return list(self.__by_class.get(cls, {}).values())
+        bitmaps = self.__bitmaps.get((cls, name), {})
+        mask = -1
+        for ref in ids:
+            mask &= int.from_bytes(bitmaps.get(ref, b""), "little")
+            if not mask:
+                return []
+        objs = []
+        while mask:
+            low = mask & -mask
+            obj = self.__objects.get(self.__slot_keys[low.bit_length() - 1])
+            if obj is not None:
+                objs.append(obj)
+            mask ^= low
+        return objs
+
+    def find(self, cls, order_by=None, limit=None, offset=0, load=None,
+             **criteria):
+        """
+        Returns the objects of a class (or class name) matching criteria
+
+        The candidates come from the best index available (see explain())
+        and are then filtered, ordered and sliced.
+
+        Args:
+            cls (class or str):     class to search
+            order_by (str or list): attribute(s) to sort by, "-" prefix
+                                    for descending
+            limit (int):            maximum number of objects returned
+            offset (int):           number of objects skipped
+            load:                   ignored, as in all()
+            criteria:               conditions (see models.engine.query)
+
+        Raises:
+            ValueError: for an unknown class, attribute or operator
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        conditions = query.parse(criteria)
+        query.check(classes.get(cls), conditions, order_by)
+        with self.__lock:
+            _, candidates, rest = self.__plan(cls, conditions)
+            objs = [obj for obj in candidates if query.matches(obj, rest)]
+        return query.page(query.order(objs, order_by), offset, limit)
+
+    def explain(self, cls, order_by=None, limit=None, offset=0, load=None,
+                **criteria):
+        """
+        Returns a description of the path find() takes for the same
+        arguments, e.g. "index City.state_id (3 candidates), then filter
+        on name"
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        conditions = query.parse(criteria)
+        query.check(classes.get(cls), conditions, order_by)
+        with self.__lock:
+            path, candidates, rest = self.__plan(cls, conditions)
+        steps = ["{} ({} candidates)".format(path, len(candidates))]
+        if rest:
+            steps.append("filter on " + ", ".join(
+                "{}__{}".format(name, op) for name, op, _ in rest))
+        if order_by:
+            steps.append("sort by " + (order_by if isinstance(order_by, str)
+                                       else ", ".join(order_by)))
+        if limit is not None or offset:
+            steps.append("slice [{}:{}]".format(
+                offset or 0, "" if limit is None else (offset or 0) + limit))
+        return ", then ".join(steps)
+
+    def __plan(self, class_name, conditions):
+        """
+        Picks the candidates for a search: an id lookup, then a reverse
+        index or amenity bitmap, and a scan of the class otherwise
+
+        Returns:
+            tuple: (path description, candidate objects, conditions left
+                    to test on the candidates)
+        """
+        if self.__pending.get(class_name):
+            self.__hydrate(class_name)
+        refs = references.get(class_name, ())
+        # list attributes (amenity_ids) are only indexed by the ids they
+        # hold, so an eq or in test on the whole list needs a scan
+        lists = {name for name in refs if isinstance(
+            getattr(classes.get(class_name), name, None), list)}
+        best = None
+        for i, (name, op, operand) in enumerate(conditions):
+            if name == "id" and op in ("eq", "in"):
+                rank = 0
+            elif name in refs and name not in lists and op in ("eq", "in"):
+                rank = 1
+            elif name in lists and op == "contains":
+                rank = 2
+            else:
+                continue
+            if best is None or rank < best[0]:
+                best = (rank, i)
+        if best is None:
+            return ("scan {}".format(class_name),
+                    list(self.__by_class.get(class_name, {}).values()),
+                    conditions)
+        rank, i = best
+        name, op, operand = conditions[i]
+        rest = conditions[:i] + conditions[i + 1:]
+        operands = operand if op == "in" else [operand]
+        if rank == 0:
+            objs = (self.__objects.get("{}.{}".format(class_name, obj_id))
+                    for obj_id in operands)
+            return ("lookup {}.id".format(class_name),
+                    [obj for obj in objs if obj is not None], rest)
+        if rank == 1:
+            index = self.__refs.get((class_name, name), {})
+            keys = dict.fromkeys(key for ref in operands
+                                 for key in index.get(ref, ()))
+            return ("index {}.{}".format(class_name, name),
+                    [self.__objects[key] for key in keys
+                     if key in self.__objects], rest)
+        return ("bitmap {}.{}".format(class_name, name),
+                self.having(class_name, name, [operand]), rest)
+
+    def __index(self, key, obj, names=None):
+        """
+        Updates the reverse index entries of an object
+
+        A list attribute is indexed as a set of ids and, per id, as a bit
+        in a bitmap over the object's slot number.
+
+        Args:
+            key (str):          <class name>.id
+            obj (BaseModel):    indexed object
+            names (tuple):      attributes to reindex (default: all)
+        """
+        class_name = obj.__class__.__name__
+        if names is None:
+            names = references.get(class_name, ())
+        if not names:
+            return
+        indexed = self.__ref_ids.setdefault(key, {})
+        for name in names:
+            value = getattr(obj, name, None)
+            if isinstance(value, (list, tuple, set, frozenset)):
+                ids = frozenset(value)
+            else:
+                ids = () if value is None else (value,)
+            old = indexed.get(name, ())
+            if ids == old:
+                continue
+            index = self.__refs.setdefault((class_name, name), {})
+            bitmaps = self.__bitmaps.setdefault((class_name, name), {})
+            for ref in old:
+                if ref not in ids:
+                    self.__unlink(index, bitmaps, ref, key)
+            for ref in ids:
+                if ref in old:
+                    continue
+                index.setdefault(ref, {})[key] = None
+                if isinstance(ids, frozenset):
+                    slot = self.__slot(key)
+                    bitmap = bitmaps.setdefault(ref, bytearray())
+                    if len(bitmap) <= slot >> 3:
+                        bitmap.extend(bytes((slot >> 3) + 1 - len(bitmap)))
+                    bitmap[slot >> 3] |= 1 << (slot & 7)
+            indexed[name] = ids
+
+    def __unindex(self, key):
+        """
+        Removes the reverse index entries of a key and frees its slot
+        """
+        indexed = self.__ref_ids.pop(key, None)
+        if indexed:
+            class_name = key.partition(".")[0]
+            for name, ids in indexed.items():
+                index = self.__refs.get((class_name, name), {})
+                bitmaps = self.__bitmaps.get((class_name, name), {})
+                for ref in ids:
+                    self.__unlink(index, bitmaps, ref, key)
+        slot = self.__slots.pop(key, None)
+        if slot is not None:
+            self.__slot_keys[slot] = None
+            self.__free_slots.append(slot)
+
+    def __unlink(self, index, bitmaps, ref, key):
+        """
+        Removes key from the entries for ref, dropping emptied entries
+        """
+        keys = index.get(ref)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del index[ref]
+        bitmap = bitmaps.get(ref)
+        slot = self.__slots.get(key)
+        if bitmap is not None and slot is not None and \
+                slot >> 3 < len(bitmap):
+            bitmap[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+            if ref not in index:
+                del bitmaps[ref]
+
+    def __slot(self, key):
+        """
+        Returns the bitmap slot number of a key, assigning a free one
+        """
+        slot = self.__slots.get(key)
+        if slot is None:
+            if self.__free_slots:
+                slot = self.__free_slots.pop()
+                self.__slot_keys[slot] = key
+            else:
+                slot = len(self.__slot_keys)
+                self.__slot_keys.append(key)
+            self.__slots[key] = slot
+        return slot
+
+    def __write_snapshot(self, persisted):
+        """
+        Writes cached fragments to the file through a temporary file
+        """
+        tmp_path = self.__file_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(self.__codec.dumps(persisted))
+        os.replace(tmp_path, self.__file_path)
+
+    def __write_shards(self, puts, dels):
+        """
+        Rewrites the shard files holding the given changed keys, along
+        with shards queued by reload(), then removes stale shard files
+
+        Args:
+            puts (dict):    keys added or updated
+            dels (list):    keys removed
+        """
+        names = self.__rewrite
+        self.__rewrite = set()
+        for key in puts:
+            name = self.__shards.name(key)
+            self.__shard_keys.setdefault(name, set()).add(key)
+            names.add(name)
+        for key in dels:
+            name = self.__shards.name(key)
+            self.__shard_keys.get(name, set()).discard(key)
+            names.add(name)
+        os.makedirs(self.__shards.directory, exist_ok=True)
+        stamp = dict(self.__stamp or {})
+        for name in names:
+            path = self.__shards.path(name)
+            keys = self.__shard_keys.get(name)
+            if keys:
+                with open(path + ".tmp", "wb") as file:
+                    file.write(self.__codec.dumps(
+                        {key: self.__persisted[key] for key in keys}))
+                os.replace(path + ".tmp", path)
+            elif os.path.exists(path):
+                os.remove(path)
+        for name in self.__stale - names:
+            os.remove(self.__shards.path(name))
+        self.__stale = set()
+        current = self.__shards.stamp()
+        for name in names | set(stamp):
+            if name not in current:
+                stamp.pop(name, None)
+            elif name in names:
+                stamp[name] = current[name]
+        self.__stamp = stamp
+
+    def __reload_shards(self, stamp):
+        """
+        Reads the shard files that changed since the last read, in
+        parallel, and migrates a single-file store on first use
+
+        Args:
+            stamp (dict):   current shard name -> file identity
+        """
+        if not os.path.isdir(self.__shards.directory) and \
+                os.path.exists(self.__file_path):
+            with open(self.__file_path, "rb") as file:
+                obj_dict = self.__codec.loads(file.read())
+            self.__apply(obj_dict, [])
+            self.__rewrite.update(self.__shards.name(key)
+                                  for key in self.__persisted)
+            self.__write_shards({}, [])
+            os.replace(self.__file_path, self.__file_path + ".migrated")
+            return
+        old = self.__stamp or {}
+        changed = [name for name in stamp if stamp[name] != old.get(name)]
+
+        def load(name):
+            """
+            Returns the records of one shard
+            """
+            try:
+                with open(self.__shards.path(name), "rb") as file:
+                    return name, self.__codec.loads(file.read())
+            except FileNotFoundError:
+                return name, {}
+
+        with ThreadPoolExecutor(max_workers=min(8, len(changed) or 1)) \
+                as pool:
+            loaded = list(pool.map(load, changed))
+        obj_dict, dels = {}, []
+        for name, records in loaded:
+            dels.extend(key for key in self.__shard_keys.get(name, ())
+                        if key not in records)
+            for key in records:
+                expected = self.__shards.name(key)
+                if expected != name:
+                    self.__stale.add(name)
+                    self.__rewrite.add(expected)
+            obj_dict.update(records)
+        for name in old:
+            if name not in stamp:
+                dels.extend(self.__shard_keys.get(name, ()))
+        self.__apply(obj_dict, dels)
+        self.__stamp = stamp
 
     def reload(self):
         """
         Deserializes JSON file to __objects
 
+        Nothing is read if the JSON file (and journal) still have the
+        identity recorded at the last save or reload. Otherwise only
+        records that differ from what this storage last saw are turned
+        back into objects, and objects removed from the file are dropped;
+        in journal mode, a journal that has only grown is read from where
+        the last read stopped.
+
         Attributes:
             obj_dict (dict):  dictionary to store objects
-            obj_class (dict): dictionary of classes
+            dels (list):      keys removed from the file
         """
-        try:
-            with open(self.__file_path, "r") as file:
-                obj_dict = json.load(file)
-            classes = {
-                "BaseModel": BaseModel,
-                "User": User,
-                "State": State,
-                "City": City,
-                "Place": Place,
-                "Amenity": Amenity,
-                "Review": Review,
-            }
+        stamp = self.__stamp_files()
+        if stamp == self.__stamp:
+            return
+        if self.__shards is not None:
+            self.__reload_shards(stamp)
+            return
+        if self.__journal is not None and self.__stamp is not None and \
+                stamp[0] == self.__stamp[0] and self.__grew(stamp[1]):
+            obj_dict, dels = {}, []
+            with self.__lock:
+                for op, key, value in self.__journal.tail():
+                    if op == "put":
+                        obj_dict[key] = value
+                    else:
+                        obj_dict.pop(key, None)
+                        dels.append(key)
+        else:
+            try:
+                with open(self.__file_path, "rb") as file:
+                    obj_dict = self.__codec.loads(file.read())
+            except FileNotFoundError:
+                obj_dict = {}
+            if self.__journal is not None:
+                with self.__lock:
+                    for op, key, value in self.__journal.replay():
+                        if op == "put":
+                            obj_dict[key] = value
+                        else:
+                            obj_dict.pop(key, None)
+            dels = [key for key in self.__persisted if key not in obj_dict]
+        self.__apply(obj_dict, dels)
+        self.__stamp = stamp
+
+    def __apply(self, obj_dict, dels):
+        """
+        Applies records read from the file to __objects
+
+        In lazy mode records of objects not built yet are only cached.
+        Objects changed or deleted here and not saved yet are left as
+        they are, so the next save writes them over the file.
+
+        Args:
+            obj_dict (dict):    key -> object dictionary read from the file
+            dels (list):        keys of objects removed from the file
+        """
+        with self.__lock:
+            for key in dels:
+                if self.__shards is not None:
+                    self.__shard_keys.get(self.__shards.name(key),
+                                          set()).discard(key)
+                self.__pending.get(key.split(".", 1)[0], set()).discard(key)
+                self.__persisted.pop(key, None)
+                if key in self.__dirty:
+                    continue
+                obj = self.__objects.pop(key, None)
+                if obj is not None:
+                    self.__by_class.get(obj.__class__.__name__, {}).pop(
+                        key, None)
+                self.__unindex(key)
+                self.__unstamp(key)
             for key, value in obj_dict.items():
-                class_name = value.pop("__class__", None)
-                if class_name in classes:
-                    if "created_at" in value:
-                        value["created_at"] = datetime.strptime(
-                            value["created_at"], "%Y-%m-%dT%H:%M:%S.%f")
-                    if "updated_at" in value:
-                        value["updated_at"] = datetime.strptime(
-                            value["updated_at"], "%Y-%m-%dT%H:%M:%S.%f")
-                    self.__objects[key] = classes[class_name](**value)
-        except FileNotFoundError:
-            pass
+                if self.__shards is not None:
+                    self.__shard_keys.setdefault(self.__shards.name(key),
+                                                 set()).add(key)
+                encoded = self.__codec.encode(value)
+                class_name = value.get("__class__")
+                if self.__persisted.get(key) == encoded and \
+                        (key in self.__objects or
+                         key in self.__pending.get(class_name, ())):
+                    continue
+                self.__persisted[key] = encoded
+                if key in self.__dirty or key in self.__deleted:
+                    continue
+                if class_name not in classes:
+                    self.__deleted.add(key)
+                elif self.__lazy and key not in self.__objects:
+                    self.__pending.setdefault(class_name, set()).add(key)
+                    self.__restamp(key, value)
+                else:
+                    self.__build(key, value)
+
+    def __hydrate(self, class_name):
+        """
+        Builds the objects of a class that lazy mode has not built yet
+        """
+        with self.__lock:
+            pending = self.__pending.pop(class_name, set())
+            for key in pending:
+                self.__build(key, self.__codec.decode(self.__persisted[key]))
+
+    def __build(self, key, value):
+        """
+        Creates an object from its dictionary and adds it to __objects
+
+        Args:
+            key (str):      <class name>.id
+            value (dict):   dictionary read from the file
+        """
+        class_name = value.pop("__class__", None)
+        obj = classes[class_name](**value)
+        hold(obj, self.__ref)
+        self.__objects[key] = obj
+        self.__by_class.setdefault(class_name, {})[key] = obj
+        self.__dirty.discard(key)
+        self.__index(key, obj)
+        self.__restamp(key, obj)
+        return obj
+
+    def __restamp(self, key, obj):
+        """
+        Records the updated_at of a live object (or of its dictionary,
+        for one lazy mode has not built) for stats()
+        """
+        class_name = key.partition(".")[0]
+        value = obj if isinstance(obj, dict) else obj.__dict__
+        stamp = value.get("updated_at")
+        stamp = stamp and timestamps.stored(stamp)
+        stamps = self.__updated.setdefault(class_name, {})
+        old = stamps.get(key)
+        stamps[key] = stamp
+        if class_name in self.__latest:
+            latest = self.__latest[class_name]
+            if stamp is not None and (latest is None or stamp >= latest):
+                self.__latest[class_name] = stamp
+            elif old is not None and old == latest:
+                del self.__latest[class_name]
+
+    def __unstamp(self, key):
+        """
+        Drops the updated_at of an object removed from storage
+        """
+        class_name = key.partition(".")[0]
+        old = self.__updated.get(class_name, {}).pop(key, None)
+        if old is not None and old == self.__latest.get(class_name):
+            del self.__latest[class_name]
+
+    def __stamp_files(self):
+        """
+        Returns the identity (inode, size, mtime) of the JSON file and
+        journal, or of every shard file, used to tell whether they changed
+        since the last read
+        """
+        if self.__shards is not None:
+            return self.__shards.stamp()
+        stamp = []
+        paths = [self.__file_path]
+        if self.__journal is not None:
+            paths.append(self.__journal.path)
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def __grew(self, journal_stamp):
+        """
+        Checks if the journal was only appended to since the last read
+        """
+        old = self.__stamp[1]
+        if journal_stamp is None:
+            return False
+        if old is None:
+            return self.__journal.size == 0
+        return journal_stamp[0] == old[0] and journal_stamp[1] >= old[1]
 
     def delete(self, obj=None):
         """
@@ -121,13 +1362,109 @@ class FileStorage:
         """
         if obj is not None:
             key = self.key_create(obj)
-            del self.__objects[key]
+            with self.__lock:
+                del self.__objects[key]
+                self.__by_class.get(obj.__class__.__name__, {}).pop(key,
+                                                                    None)
+                self.__dirty.discard(key)
+                self.__deleted.add(key)
+                self.__unindex(key)
+                self.__unstamp(key)
+                self.__touch(key, obj)
         else:
             return
 
+    def delete_many(self, objs):
+        """
+        Deletes objects and the objects depending on them (see cascade())
+        and writes the change with a single save()
+
+        Returns:
+            int: number of objects deleted
+        """
+        with self.__lock:
+            deleted = 0
+            for obj in cascade(self, objs):
+                if self.key_create(obj) in self.__objects:
+                    self.delete(obj)
+                    deleted += 1
+        self.save()
+        return deleted
+
+    def truncate(self, cls=None):
+        """
+        Deletes every object of a class (or class name), with its
+        dependents, or every object, with a single save()
+
+        Returns:
+            int: number of objects deleted
+        """
+        if cls is not None:
+            return self.delete_many(list(self.iter(cls)))
+        with self.__lock:
+            deleted = self.count()
+            self.__deleted.update(self.__objects)
+            for key, obj in self.__objects.items():
+                self.__touch(key, obj)
+            for keys in self.__pending.values():
+                self.__deleted.update(keys)
+                for key in keys:
+                    self.__touch(key, None)
+            self.__pending.clear()
+            self.__updated.clear()
+            self.__latest.clear()
+            self.__objects.clear()
+            self.__by_class.clear()
+            self.__dirty.clear()
+            self.__refs.clear()
+            self.__ref_ids.clear()
+            self.__bitmaps.clear()
+            self.__slots.clear()
+            self.__slot_keys.clear()
+            self.__free_slots.clear()
+        self.save()
+        return deleted
+
+    def compact(self):
+        """
+        Folds the journal into the JSON file
+
+        The live journal is moved aside and the current state is written
+        to a temporary file that replaces the JSON file; the old journal is
+        only removed after that, so a crash at any point loses nothing.
+        All of it happens under the journal's writer lock, after reading
+        what other processes appended, so none of their records is lost.
+        Readers never compact; save() starts it in the background once
+        the journal is long, or when a rotated journal was left behind.
+        """
+        if self.__journal is None:
+            return
+        with self.__compacting, self.__journal.lock():
+            self.reload()
+            with self.__lock:
+                if not self.__journal.rotate() and \
+                        not self.__journal.pending():
+                    return
+                persisted = dict(self.__persisted)
+            self.__write_snapshot(persisted)
+            self.__journal.discard()
+            with self.__lock:
+                self.__stamp = self.__stamp_files()
+
+    def __compact_later(self):
+        """
+        Starts a background compaction unless one is already running
+        """
+        if self.__compactor is not None and self.__compactor.is_alive():
+            return
+        self.__compactor = threading.Thread(target=self.compact,
+                                            daemon=True)
+        self.__compactor.start()
+
     def close(self):
         """
-        Calls reload method for deserialization
+        Calls reload method for deserialization, which returns at once
+        when the file has not changed
         """
         self.reload()
 
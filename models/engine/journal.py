@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+"""
+This module contains the Journal class.
+"""
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+
+class Journal:
+    """
+    Append-only log of storage changes kept next to a snapshot file
+
+    Each record is one line of JSON: {"op": "put", "key": ..., "value": ...}
+    for a new or updated object, {"op": "del", "key": ...} for a deletion.
+
+    Several processes may share a journal. Readers only read it, stopping
+    before a torn record; writers append, rotate and discard while holding
+    lock(), an exclusive lock on a file next to the log, so a record still
+    being written is never cut off or moved away.
+
+    Attributes:
+        path (str):         path to the live log
+        old_path (str):     path the live log is moved to during compaction
+        lock_path (str):    path of the file writers lock
+        records (int):      number of records in the live log
+        size (int):         bytes of the live log already applied
+        inode (int):        inode of that live log, or None
+
+    Methods:
+        lock(self):                 holds the writers' exclusive lock
+        append(self, puts, dels):   appends put and delete records
+        replay(self):               yields (op, key, value) from the logs
+        tail(self):                 yields records appended since last read
+        rotate(self):               moves the live log aside for compaction
+        discard(self):              removes the rotated log
+        pending(self):              checks for a rotated log left behind
+    """
+
+    def __init__(self, path):
+        """
+        Initializes a journal for the given log path
+        """
+        self.path = path
+        self.old_path = path + ".old"
+        self.lock_path = path + ".lock"
+        self.records = 0
+        self.size = 0
+        self.inode = None
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds the exclusive lock that append(), rotate() and discard()
+        need, across threads and processes
+        """
+        with open(self.lock_path, "ab") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield self
+
+    def append(self, puts, dels):
+        """
+        Appends records to the live log, first cutting off a torn record
+        left by a writer that died mid-append; call it holding lock()
+
+        Args:
+            puts (dict):    key -> JSON-encoded object dictionary
+            dels (iterable): keys of deleted objects
+
+        Returns:
+            bool: True if the log now holds nothing left to read
+        """
+        lines = ['{{"op": "put", "key": {}, "value": {}}}\n'.format(
+                 json.dumps(key), value) for key, value in puts.items()]
+        lines.extend('{{"op": "del", "key": {}}}\n'.format(json.dumps(key))
+                     for key in dels)
+        if not lines:
+            return False
+        data = "".join(lines).encode("utf-8")
+        with open(self.path, "a+b") as file:
+            self.__repair(file)
+            start = file.seek(0, os.SEEK_END)
+            inode = os.fstat(file.fileno()).st_ino
+            file.write(data)
+        self.records += len(lines)
+        if start != self.size or self.inode not in (None, inode):
+            # tail() still has other writers' records to read first, and
+            # reads these again after them
+            return False
+        self.size += len(data)
+        self.inode = inode
+        return True
+
+    def replay(self):
+        """
+        Yields (op, key, value) for every complete record, oldest first
+
+        A torn or corrupt record ends the log. It is left in place, as
+        another process may still be writing it; the next append() cuts
+        off a torn one.
+        """
+        self.records = 0
+        self.size = 0
+        self.inode = None
+        for path in (self.old_path, self.path):
+            live = path == self.path
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with file:
+                if live:
+                    self.inode = os.fstat(file.fileno()).st_ino
+                good = 0
+                for line in file:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("torn record")
+                        record = json.loads(line)
+                        op, key = record["op"], record["key"]
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    good += len(line)
+                    if live:
+                        self.records += 1
+                        self.size = good
+                    yield op, key, record.get("value")
+
+    def tail(self):
+        """
+        Yields (op, key, value) for records appended by another writer
+
+        Reading starts where the last replay, tail or append left off and
+        stops before an incomplete record, which may still be in flight.
+        """
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            if self.inode is None:
+                self.inode = os.fstat(file.fileno()).st_ino
+            file.seek(self.size)
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("torn record")
+                    record = json.loads(line)
+                    op, key = record["op"], record["key"]
+                except (ValueError, KeyError, TypeError):
+                    break
+                self.size += len(line)
+                self.records += 1
+                yield op, key, record.get("value")
+
+    @staticmethod
+    def __repair(file):
+        """
+        Truncates an open log after its last complete line
+        """
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b"\n":
+            return
+        good = end - 1
+        while good > 0:
+            start = max(good - 65536, 0)
+            file.seek(start)
+            newline = file.read(good - start).rfind(b"\n")
+            if newline != -1:
+                good = start + newline + 1
+                break
+            good = start
+        file.truncate(good)
+
+    def rotate(self):
+        """
+        Moves the live log aside so a snapshot can absorb it; call it
+        holding lock()
+
+        Returns:
+            bool: True if there was a log to rotate
+        """
+        if not os.path.exists(self.path):
+            return False
+        if os.path.exists(self.old_path):
+            with open(self.path, "rb") as live, \
+                    open(self.old_path, "ab") as old:
+                old.write(live.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.old_path)
+        self.records = 0
+        self.size = 0
+        self.inode = None
+        return True
+
+    def discard(self):
+        """
+        Removes the rotated log once its records are in the snapshot;
+        call it holding lock()
+        """
+        try:
+            os.remove(self.old_path)
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        """
+        Returns True if a rotated log was left behind
+        """
+        return os.path.exists(self.old_path)
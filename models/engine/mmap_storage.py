@@ -0,0 +1,972 @@
+#!/usr/bin/python3
+"""
+This module contains the MmapStorage class.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import uuid
+import weakref
+from collections.abc import Mapping
+from contextlib import contextmanager
+from models.engine.file_storage import classes, build_objects, \
+    check_references, cascade, select_columns
+from models.base_model import hold, copy_state, restore_state
+from models.engine import timestamps
+from models.engine import query
+
+
+class MmapStorage:
+    """
+    Read-mostly storage that memory-maps its data file and decodes an
+    object only when it is asked for
+
+    The data file (file.jsonl) starts with a header line holding a
+    generation token, followed by one line per change: "<key>\\t<JSON>"
+    for a new or updated object and "<key>\\t" for a deleted one. A sorted
+    index file (file.jsonl.idx) maps each key to the (offset, length) of
+    its latest line and is memory-mapped too, so opening the store costs
+    the same whatever its size; only lines appended after the index was
+    written are scanned and kept in a small in-memory overlay. Several
+    processes reading the same store share the page cache rather than
+    each holding every object. Appends and compactions hold an exclusive
+    flock() on the data file, so several processes can also write to it.
+
+    Attributes:
+        __file_path (str):  path to the data file
+        __objects (dict):   key -> object decoded (or added) so far
+        __tail (dict):      key -> (offset, length), or None if deleted,
+                            for lines not covered by the index
+        __transactions (dict): thread id -> open transaction() blocks of
+                            that thread, innermost last
+        index_every (int):  overlay size at which save() rewrites the index
+
+    Methods:
+        all(self, cls=None, load=None, columns=None): returns a lazy
+                                mapping of objects (or their columns)
+        get(self, cls, id):     returns one object by class and id
+        exists(self, cls, id):  checks if an object is stored
+        children(self, cls, name, id): returns objects referencing an id
+        having(self, cls, name, ids): returns objects holding all ids
+        iter(self, cls=None, batch_size=1000): yields stored objects
+        new_many(self, objs, cls=None): adds many objects at once
+        save_many(self, objs, cls=None): adds and saves many objects
+        delete_many(self, objs): deletes objects and their dependents
+        truncate(self, cls=None): deletes every object (of a class)
+        transaction(self):      defers saves, rolls back on error
+        find(self, cls, ...):   returns objects matching criteria
+        explain(self, cls, ...): describes how find() would run
+        missing(self, cls, ids): returns the ids not stored
+        count(self, cls=None):  returns the number of objects
+        stats(self):            returns per-class counts and last update
+        new(self, obj):         adds object to storage
+        save(self):             appends changed objects to the data file
+        reload(self):           maps the data file and its index
+        delete(self, obj=None): deletes object from storage
+        compact(self):          rewrites the data file without dead lines
+        key_create(self, obj):  creates key
+    """
+    __file_path = "file.jsonl"
+    index_magic = b"HBNBI\x01\n"
+    entry = struct.Struct("<BQQI")
+    index_every = 10000
+
+    def __init__(self, file_path=None):
+        """
+        Initializes an unopened storage
+
+        Args:
+            file_path (str):    path to the data file (default: file.jsonl)
+        """
+        if file_path is not None:
+            self.__file_path = file_path
+        self.__index_path = self.__file_path + ".idx"
+        self.__objects = {}
+        self.__dirty = set()
+        self.__deleted = set()
+        self.__tail = {}
+        self.__data = None
+        self.__index = None
+        self.__entries = 0
+        self.__index_start = 0
+        self.__class_ids = {}
+        self.__generation = None
+        self.__scanned = 0
+        self.__stamp = None
+        self.__transactions = {}
+        self.__ref = weakref.ref(self)
+
+    def all(self, cls=None, load=None, columns=None):
+        """
+        Returns a read-only mapping of objects, decoded on access
+
+        Args:
+            cls (class or str): only objects of this class
+            load:               ignored; accepted for compatibility with
+                                DBStorage
+            columns (list):     column names; if given, returns key ->
+                                {"id": ..., column: value} read from the
+                                stored lines without building objects
+        """
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        if columns is None:
+            return Records(self, cls)
+        rows = {}
+        for key in self.keys(cls):
+            source = self.__objects.get(key)
+            if source is None:
+                source = self.__read_value(key)
+            if source is not None:
+                rows[key] = select_columns(source, columns)
+        return rows
+
+    def new(self, obj):
+        """
+        Adds object to storage (<class name>.id)
+        """
+        key = self.key_create(obj)
+        hold(obj, self.__ref)
+        self.__objects[key] = obj
+        self.__dirty.add(key)
+        self.__deleted.discard(key)
+        self.__touch(key, obj)
+
+    def new_many(self, objs, cls=None):
+        """
+        Adds many objects (instances or dictionaries) after checking all
+        their references at once, and returns their ids
+        """
+        objs = build_objects(objs, cls)
+        check_references(self, objs)
+        for obj in objs:
+            self.new(obj)
+        return [obj.id for obj in objs]
+
+    def save_many(self, objs, cls=None):
+        """
+        Adds many objects like new_many() and appends them in one write
+        """
+        ids = self.new_many(objs, cls)
+        self.save()
+        return ids
+
+    def delete_many(self, objs):
+        """
+        Deletes objects and the objects depending on them (see
+        file_storage.cascade()) with a single append, and returns the
+        number deleted
+        """
+        deleted = 0
+        for obj in cascade(self, objs):
+            if self.contains(self.key_create(obj)):
+                self.delete(obj)
+                deleted += 1
+        self.save()
+        return deleted
+
+    def truncate(self, cls=None):
+        """
+        Deletes every object of a class (or class name), with its
+        dependents, or every object, and returns the number deleted
+        """
+        return self.delete_many(list(self.iter(cls)))
+
+    def mark_dirty(self, obj, name=None):
+        """
+        Flags a decoded object for writing on the next save
+        """
+        obj_id = obj.__dict__.get("id")
+        if obj_id is None:
+            return
+        key = obj.__class__.__name__ + "." + obj_id
+        if self.__objects.get(key) is obj:
+            self.__dirty.add(key)
+            self.__touch(key, obj)
+
+    def delete(self, obj=None):
+        """
+        Deletes object from storage
+        """
+        if obj is None:
+            return
+        key = self.key_create(obj)
+        self.__objects.pop(key, None)
+        self.__dirty.discard(key)
+        self.__deleted.add(key)
+        self.__touch(key, obj)
+
+    def save(self):
+        """
+        Appends a line for every object added, changed or deleted since
+        the last save, or nothing until the end of the calling thread's
+        outermost transaction() block
+        """
+        if threading.get_ident() in self.__transactions:
+            return
+        if not self.__dirty and not self.__deleted:
+            return
+        if self.__generation is None:
+            self.__create()
+        with self.__locked() as file:
+            # other processes append under the same lock, so the end of
+            # the file is where the new lines start
+            offset = file.seek(0, os.SEEK_END)
+            if self.__stamp is not None and \
+                    os.fstat(file.fileno()).st_ino != self.__stamp[0]:
+                # replaced (compacted) by another process
+                self.reload()
+            elif offset != self.__scanned:
+                self.__map_data()
+                self.__scan(self.__scanned)
+            lines = []
+            for key in self.__dirty:
+                obj = self.__objects.get(key)
+                if obj is not None:
+                    lines.append((key, json.dumps(obj.to_dict())))
+            lines.extend((key, "") for key in self.__deleted)
+            self.__dirty.clear()
+            self.__deleted.clear()
+            chunks = []
+            for key, value in lines:
+                line = "{}\t{}".format(key, value).encode("utf-8")
+                self.__tail[key] = (offset, len(line)) if value else None
+                chunks.append(line)
+                offset += len(line) + 1
+            if chunks:
+                file.write(b"\n".join(chunks) + b"\n")
+        self.__scanned = offset
+        self.__map_data()
+        self.__stamp = self.__stamp_file()
+        if len(self.__tail) >= self.index_every:
+            self.__write_index()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups changes into one unit of work
+
+        save() calls inside the block are deferred to a single append at
+        the end of the outermost block. If the block raises, the objects
+        it added, changed or deleted are put back, in place, as they were
+        when it started, and the exception propagates; an inner block
+        only undoes its own changes. Unsaved changes are appended when the
+        outermost block starts, so the data file is what a rollback reads.
+        Blocks belong to the thread that opens them: other threads' saves
+        are not deferred, and only this thread's changes are undone.
+        """
+        thread = threading.get_ident()
+        frames = self.__transactions.get(thread)
+        snapshot = {}
+        if frames is None:
+            self.save()
+            frames = self.__transactions[thread] = []
+            stored = {}
+        else:
+            stored = frames[0]["stored"]
+            for frame in frames:
+                for key, obj in frame["touched"].items():
+                    current = self.__objects.get(key)
+                    snapshot[key] = (obj, copy_state(current)
+                                     if current is not None else None)
+        frame = {"touched": {}, "snapshot": snapshot, "stored": stored}
+        frames.append(frame)
+        try:
+            yield self
+        except BaseException:
+            self.__pop_frame(thread, frame)
+            self.__rollback(frame, thread not in self.__transactions)
+            raise
+        self.__pop_frame(thread, frame)
+        if thread in self.__transactions:
+            touched = self.__transactions[thread][-1]["touched"]
+            for key, obj in frame["touched"].items():
+                touched.setdefault(key, obj)
+        else:
+            self.save()
+
+    def __pop_frame(self, thread, frame):
+        """
+        Closes a thread's innermost transaction block
+        """
+        frames = self.__transactions[thread]
+        frames.remove(frame)
+        if not frames:
+            del self.__transactions[thread]
+
+    def __touch(self, key, obj):
+        """
+        Records an object changed inside a transaction block of the
+        calling thread, with the location of its stored line the first
+        time
+        """
+        frames = self.__transactions.get(threading.get_ident())
+        if frames:
+            frames[-1]["touched"].setdefault(key, obj)
+            if key not in frames[0]["stored"]:
+                frames[0]["stored"][key] = self.__locate(key)
+
+    def __rollback(self, frame, outermost):
+        """
+        Puts the objects touched in a transaction block back as they were
+        when it started: from the block's snapshot for objects an outer
+        block had already touched, from the line stored when the
+        transaction first touched them otherwise
+        """
+        stored = frame["stored"]
+        for key, obj in frame["touched"].items():
+            if key in frame["snapshot"]:
+                obj, state = frame["snapshot"][key]
+            else:
+                try:
+                    value = self.__read_at(key, stored.get(key))
+                except KeyError:
+                    # the data file was rewritten since the block started
+                    value = self.__read_value(key)
+                state = value and self.__build(value).__dict__
+            if state is None:
+                current = self.__objects.get(key)
+                if current is not None:
+                    self.delete(current)
+                continue
+            restore_state(obj, state)
+            self.new(obj)
+        if outermost:
+            # objects whose stored line did not change meanwhile are back
+            # to the stored state, so there is nothing left to write
+            unchanged = [key for key in frame["touched"]
+                         if self.__locate(key) == stored.get(key)]
+            self.__dirty.difference_update(unchanged)
+            self.__deleted.difference_update(unchanged)
+
+    def reload(self):
+        """
+        Maps the data file and its index
+
+        Returns at once when the data file has not changed; reads only
+        the appended lines when it has grown, and reopens everything when
+        it was replaced (e.g. compacted by another process). A single
+        file.json store found on first use is imported.
+        """
+        stamp = self.__stamp_file()
+        if stamp is not None and stamp == self.__stamp:
+            return
+        if stamp is None:
+            json_path = os.path.splitext(self.__file_path)[0] + ".json"
+            if os.path.exists(json_path):
+                self.__import(json_path)
+            return
+        if self.__stamp is not None and stamp[0] == self.__stamp[0] and \
+                stamp[1] >= self.__stamp[1]:
+            self.__map_data()
+            self.__scan(self.__scanned)
+            self.__stamp = stamp
+            return
+        self.__objects = {key: obj for key, obj in self.__objects.items()
+                          if key in self.__dirty}
+        self.__tail = {}
+        self.__map_data()
+        self.__generation = self.__read_generation()
+        if not self.__map_index():
+            self.__scan(self.__header_size())
+            self.__write_index()
+        else:
+            self.__scan(self.__scanned)
+        self.__stamp = stamp
+
+    def close(self):
+        """
+        Picks up changes made by other processes
+        """
+        self.reload()
+
+    def key_create(self, obj):
+        """
+        Helper function to create key
+        """
+        return obj.__class__.__name__ + "." + obj.id
+
+    def get(self, cls, id, load=None):
+        """
+        Returns the object of a class (or class name) with the given id,
+        or None (load is ignored, as in all())
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        return self.get_object("{}.{}".format(cls, id))
+
+    def iter(self, cls=None, batch_size=1000):
+        """
+        Yields the objects of a class (or class name), or every object,
+        decoding batch_size at a time
+        """
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        keys = sorted(self.keys(cls))
+        for start in range(0, len(keys), batch_size):
+            for key in keys[start:start + batch_size]:
+                obj = self.get_object(key)
+                if obj is not None:
+                    yield obj
+
+    def get_object(self, key):
+        """
+        Returns the object stored under key, decoding it if needed, or None
+        """
+        obj = self.__objects.get(key)
+        if obj is not None or key in self.__deleted:
+            return obj
+        value = self.__read_value(key)
+        if value is None:
+            return None
+        obj = self.__build(value)
+        hold(obj, self.__ref)
+        self.__objects[key] = obj
+        return obj
+
+    def exists(self, cls, id):
+        """
+        Checks if an object of a class (or class name) with the given id
+        is stored, without decoding it
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        return self.contains("{}.{}".format(cls, id))
+
+    def children(self, cls, name, id):
+        """
+        Returns the objects of a class (or class name) whose attribute
+        name holds the given id
+
+        The store keeps no reverse index, so this decodes the class.
+        """
+        matches = []
+        for obj in self.all(cls).values():
+            value = getattr(obj, name, None)
+            if value == id or isinstance(value, (list, tuple, set,
+                                                 frozenset)) and id in value:
+                matches.append(obj)
+        return matches
+
+    def having(self, cls, name, ids):
+        """
+        Returns the objects of a class (or class name) whose list
+        attribute name holds every one of the given ids, decoding the
+        class
+        """
+        ids = set(ids)
+        return [obj for obj in self.all(cls).values()
+                if ids.issubset(getattr(obj, name, None) or ())]
+
+    def find(self, cls, order_by=None, limit=None, offset=0, load=None,
+             **criteria):
+        """
+        Returns the objects of a class (or class name) matching criteria
+        (see models.engine.query), ordered and sliced (load is ignored,
+        as in all())
+
+        Only an id lookup uses the key index; anything else decodes the
+        class.
+
+        Raises:
+            ValueError: for an unknown class, attribute or operator
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        conditions = query.parse(criteria)
+        query.check(classes.get(cls), conditions, order_by)
+        _, candidates, rest = self.__plan(cls, conditions)
+        objs = [obj for obj in candidates if query.matches(obj, rest)]
+        return query.page(query.order(objs, order_by), offset, limit)
+
+    def explain(self, cls, order_by=None, limit=None, offset=0, load=None,
+                **criteria):
+        """
+        Returns a description of the path find() takes
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        conditions = query.parse(criteria)
+        query.check(classes.get(cls), conditions, order_by)
+        path, candidates, rest = self.__plan(cls, conditions)
+        return "{} ({} candidates){}".format(
+            path, len(candidates), ", then filter" if rest else "")
+
+    def __plan(self, cls, conditions):
+        """
+        Returns (path description, candidate objects, conditions left)
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        for i, (name, op, operand) in enumerate(conditions):
+            if name == "id" and op in ("eq", "in"):
+                objs = (self.get(cls, obj_id) for obj_id in
+                        (operand if op == "in" else [operand]))
+                return ("lookup {}.id".format(cls),
+                        [obj for obj in objs if obj is not None],
+                        conditions[:i] + conditions[i + 1:])
+        return ("scan {}".format(cls), list(self.all(cls).values()),
+                conditions)
+
+    def missing(self, cls, ids):
+        """
+        Returns the set of ids with no stored object of a class (or class
+        name)
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        return {id for id in ids
+                if not self.contains("{}.{}".format(cls, id))}
+
+    def count(self, cls=None):
+        """
+        Returns the number of objects of a class (or class name), or of
+        all objects, without decoding any
+        """
+        if cls is not None and not isinstance(cls, str):
+            cls = cls.__name__
+        return len(self.keys(cls))
+
+    def stats(self):
+        """
+        Returns class name -> {"count": number of objects, "updated_at":
+        latest updated_at or None} for every class, reading the stored
+        lines instead of building objects
+        """
+        stats = {}
+        for class_name in classes:
+            keys = self.keys(class_name)
+            stamps = []
+            for key in keys:
+                obj = self.__objects.get(key)
+                value = obj.__dict__ if obj is not None else \
+                    self.__read_value(key) or {}
+                if value.get("updated_at") is not None:
+                    stamps.append(timestamps.stored(value["updated_at"]))
+            latest = max(stamps, default=None)
+            stats[class_name] = {
+                "count": len(keys),
+                "updated_at": latest and timestamps.parse(latest)}
+        return stats
+
+    def __read_value(self, key):
+        """
+        Returns the dictionary on the latest line for key, or None
+
+        A line holding another key means the overlay no longer matches
+        the data file (e.g. another process compacted it), so the file
+        is mapped again once.
+        """
+        try:
+            return self.__read_at(key, self.__locate(key))
+        except KeyError:
+            self.__stamp = None
+            self.reload()
+            return self.__read_at(key, self.__locate(key))
+
+    def __read_at(self, key, location):
+        """
+        Returns the dictionary on the line at location (offset, length),
+        or None
+
+        Raises:
+            KeyError: if the line there is not one of key's
+        """
+        if location is None:
+            return None
+        offset, length = location
+        line = self.__data[offset:offset + length] \
+            if self.__data is not None else b""
+        tab = line.find(b"\t")
+        if tab == -1 or line[:tab] != key.encode("utf-8"):
+            raise KeyError(key)
+        return json.loads(line[tab + 1:])
+
+    def contains(self, key):
+        """
+        Checks if an object is stored under key, without decoding it
+        """
+        if key in self.__objects:
+            return True
+        if key in self.__deleted:
+            return False
+        return self.__locate(key) is not None
+
+    def keys(self, class_name=None):
+        """
+        Returns the live keys, optionally of one class, without decoding
+        """
+        keys = set()
+        if class_name is None:
+            class_ids = list(self.__class_ids.values())
+        elif class_name in self.__class_ids:
+            class_ids = [self.__class_ids[class_name]]
+        else:
+            class_ids = []
+        for class_id in class_ids:
+            start = self.__bisect((class_id, 0))
+            end = self.__bisect((class_id + 1, 0))
+            for i in range(start, end):
+                keys.add(self.__key_at(self.__read_entry(i)[2]))
+        prefix = None if class_name is None else class_name + "."
+        for key, location in self.__tail.items():
+            if prefix is None or key.startswith(prefix):
+                if location is None:
+                    keys.discard(key)
+                else:
+                    keys.add(key)
+        for key in self.__objects:
+            if prefix is None or key.startswith(prefix):
+                keys.add(key)
+        keys.difference_update(self.__deleted)
+        return keys
+
+    def compact(self):
+        """
+        Rewrites the data file with only the latest line of each live
+        object, then rewrites the index
+        """
+        self.save()
+        if self.__generation is None:
+            return
+        with self.__locked():
+            # lines appended by other processes since the last read
+            self.reload()
+            self.__rewrite()
+
+    def __rewrite(self):
+        """
+        Writes the latest line of each live object to a new data file
+        and index, which replace the old ones
+        """
+        locations = self.__locations()
+        generation = uuid.uuid4().hex
+        tmp_path = self.__file_path + ".tmp"
+        tail = {}
+        with open(tmp_path, "wb") as file:
+            header = "#HBNB {}\n".format(generation).encode("utf-8")
+            file.write(header)
+            offset = len(header)
+            for key, location in sorted(locations.items()):
+                line = self.__data[location[0]:location[0] + location[1]]
+                file.write(line + b"\n")
+                tail[key] = (offset, len(line))
+                offset += len(line) + 1
+        os.replace(tmp_path, self.__file_path)
+        self.__generation = generation
+        self.__tail = tail
+        self.__index = None
+        self.__entries = 0
+        self.__scanned = offset
+        self.__map_data()
+        self.__write_index()
+        self.__stamp = self.__stamp_file()
+
+    @contextmanager
+    def __locked(self):
+        """
+        Opens the data file for appending, holding the lock that save()
+        and compact() take in every process; reopens it if another
+        process replaced it while this one waited
+        """
+        while True:
+            with open(self.__file_path, "ab") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                if os.fstat(file.fileno()).st_ino == \
+                        os.stat(self.__file_path).st_ino:
+                    yield file
+                    return
+
+    def __build(self, value):
+        """
+        Creates an object from its dictionary
+        """
+        class_name = value.pop("__class__", None)
+        return classes[class_name](**value)
+
+    def __locate(self, key):
+        """
+        Returns the (offset, length) of the latest line for key, or None
+        """
+        if key in self.__tail:
+            return self.__tail[key]
+        class_name, _, obj_id = key.partition(".")
+        class_id = self.__class_ids.get(class_name)
+        if class_id is None:
+            return None
+        target = (class_id, self.__hash(obj_id))
+        i = self.__bisect(target)
+        while i < self.__entries:
+            class_id, digest, offset, length = self.__read_entry(i)
+            if (class_id, digest) != target:
+                break
+            if self.__key_at(offset) == key:
+                return offset, length
+            i += 1
+        return None
+
+    def __bisect(self, target):
+        """
+        Returns the first index entry not lower than (class id, hash)
+        """
+        low, high = 0, self.__entries
+        while low < high:
+            middle = (low + high) // 2
+            if self.__read_entry(middle)[:2] < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __read_entry(self, i):
+        """
+        Returns (class id, hash, offset, length) of index entry i
+        """
+        return self.entry.unpack_from(
+            self.__index, self.__index_start + i * self.entry.size)
+
+    def __key_at(self, offset):
+        """
+        Returns the key of the data line starting at offset
+        """
+        end = self.__data.find(b"\t", offset)
+        return self.__data[offset:end].decode("utf-8")
+
+    @staticmethod
+    def __hash(obj_id):
+        """
+        Returns the 64-bit hash of an id used to order the index
+        """
+        return int.from_bytes(hashlib.blake2b(
+            obj_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def __scan(self, offset):
+        """
+        Adds lines from offset to the end of the data file to the overlay
+        """
+        data = self.__data
+        size = len(data) if data is not None else 0
+        while offset < size:
+            end = data.find(b"\n", offset)
+            if end == -1:
+                break
+            tab = data.find(b"\t", offset, end)
+            if tab != -1:
+                key = data[offset:tab].decode("utf-8")
+                self.__tail[key] = (offset, end - offset) \
+                    if end > tab + 1 else None
+                if key not in self.__dirty:
+                    self.__objects.pop(key, None)
+            offset = end + 1
+        self.__scanned = offset
+
+    def __map_data(self):
+        """
+        (Re)maps the data file
+        """
+        try:
+            with open(self.__file_path, "rb") as file:
+                self.__data = mmap.mmap(file.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            self.__data = None
+
+    def __map_index(self):
+        """
+        Maps the index file if it matches the data file
+
+        Returns:
+            bool: False if there is no usable index
+        """
+        self.__index = None
+        self.__entries = 0
+        self.__class_ids = {}
+        try:
+            with open(self.__index_path, "rb") as file:
+                index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return False
+        if index[:len(self.index_magic)] != self.index_magic:
+            return False
+        offset = len(self.index_magic)
+        size, covered, count = struct.unpack_from("<HQI", index, offset)
+        offset += 14
+        generation = index[offset:offset + size].decode("utf-8")
+        offset += size
+        if generation != self.__generation or \
+                covered > len(self.__data or b""):
+            return False
+        names, = struct.unpack_from("<H", index, offset)
+        offset += 2
+        for class_id in range(names):
+            size, = struct.unpack_from("<H", index, offset)
+            offset += 2
+            self.__class_ids[index[offset:offset + size].decode(
+                "utf-8")] = class_id
+            offset += size
+        self.__index = index
+        self.__entries = count
+        self.__index_start = offset
+        self.__scanned = covered
+        return True
+
+    def __locations(self):
+        """
+        Returns key -> (offset, length) of the latest line of every live
+        object, from the index and the overlay
+        """
+        locations = {}
+        for i in range(self.__entries):
+            _, _, offset, length = self.__read_entry(i)
+            locations[self.__key_at(offset)] = (offset, length)
+        for key, location in self.__tail.items():
+            if location is None:
+                locations.pop(key, None)
+            else:
+                locations[key] = location
+        return locations
+
+    def __write_index(self):
+        """
+        Writes a sorted index of every live line and clears the overlay
+        """
+        locations = self.__locations()
+        names = sorted({key.partition(".")[0] for key in locations})
+        class_ids = {name: i for i, name in enumerate(names)}
+        entries = []
+        for key, (offset, length) in locations.items():
+            class_name, _, obj_id = key.partition(".")
+            entries.append((class_ids[class_name], self.__hash(obj_id),
+                            offset, length))
+        entries.sort()
+        generation = self.__generation.encode("utf-8")
+        chunks = [self.index_magic,
+                  struct.pack("<HQI", len(generation), self.__scanned,
+                              len(entries)), generation,
+                  struct.pack("<H", len(names))]
+        for name in names:
+            encoded = name.encode("utf-8")
+            chunks.append(struct.pack("<H", len(encoded)) + encoded)
+        chunks.extend(self.entry.pack(*entry) for entry in entries)
+        tmp_path = self.__index_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(b"".join(chunks))
+        os.replace(tmp_path, self.__index_path)
+        self.__tail = {}
+        self.__map_index()
+
+    def __create(self):
+        """
+        Creates an empty data file with a fresh generation token
+        """
+        self.__generation = uuid.uuid4().hex
+        with open(self.__file_path, "wb") as file:
+            file.write("#HBNB {}\n".format(self.__generation).encode(
+                "utf-8"))
+        self.__map_data()
+        self.__scanned = self.__header_size()
+
+    def __import(self, json_path):
+        """
+        Builds the data file from a file.json store
+        """
+        with open(json_path, "r", encoding="utf-8") as file:
+            obj_dict = json.load(file)
+        self.__create()
+        offset = self.__scanned
+        chunks = []
+        for key, value in obj_dict.items():
+            line = "{}\t{}".format(key, json.dumps(value)).encode("utf-8")
+            self.__tail[key] = (offset, len(line))
+            chunks.append(line + b"\n")
+            offset += len(line) + 1
+        with open(self.__file_path, "ab") as file:
+            file.write(b"".join(chunks))
+        self.__scanned = offset
+        self.__map_data()
+        self.__write_index()
+        self.__stamp = self.__stamp_file()
+
+    def __read_generation(self):
+        """
+        Returns the generation token from the data file header
+        """
+        if self.__data is None:
+            return None
+        end = self.__data.find(b"\n")
+        header = self.__data[:end].decode("utf-8").split()
+        return header[1] if len(header) == 2 else None
+
+    def __header_size(self):
+        """
+        Returns the size of the data file header line
+        """
+        if self.__data is None:
+            return 0
+        return self.__data.find(b"\n") + 1
+
+    def __stamp_file(self):
+        """
+        Returns the identity (inode, size) of the data file, or None
+        """
+        try:
+            stat = os.stat(self.__file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+
+class Records(Mapping):
+    """
+    Read-only mapping over the objects of an MmapStorage
+
+    Keys are listed from the index without decoding anything; an object
+    is decoded the first time its key is looked up or its value is
+    iterated.
+    """
+
+    def __init__(self, storage, class_name=None):
+        """
+        Initializes a view of one class (or of every class)
+        """
+        self.__storage = storage
+        self.__class_name = class_name
+
+    def __prefixed(self, key):
+        """
+        Checks that key belongs to the class of this view
+        """
+        return self.__class_name is None or \
+            key.startswith(self.__class_name + ".")
+
+    def __getitem__(self, key):
+        """
+        Returns the object stored under key
+        """
+        obj = self.__storage.get_object(key) if self.__prefixed(key) \
+            else None
+        if obj is None:
+            raise KeyError(key)
+        return obj
+
+    def __contains__(self, key):
+        """
+        Checks for key without decoding its object
+        """
+        return self.__prefixed(key) and self.__storage.contains(key)
+
+    def __iter__(self):
+        """
+        Iterates over the keys
+        """
+        return iter(self.__storage.keys(self.__class_name))
+
+    def __len__(self):
+        """
+        Returns the number of objects
+        """
+        return len(self.__storage.keys(self.__class_name))
@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+"""
+This module contains the connection pool settings and telemetry used by
+DBStorage.
+
+The pool is configured through environment variables sharing a prefix
+(HBNB_MYSQL_ for the main database):
+
+    <prefix>POOL_SIZE       connections kept open (default 5)
+    <prefix>MAX_OVERFLOW    extra connections opened under load (10)
+    <prefix>POOL_TIMEOUT    seconds to wait for a free connection (30)
+    <prefix>POOL_RECYCLE    seconds after which a connection is replaced
+                            on checkout, -1 to never replace it (-1)
+    <prefix>PRE_PING        1 to test every connection on checkout with a
+                            round trip, 0 to rely on POOL_RECYCLE (1)
+
+Metrics counts checkouts, waits, overflow connections and invalidations
+from the pool's events while the engine runs.
+"""
+import os
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+# environment variable suffix -> (create_engine() argument, type, default)
+settings = {
+    "POOL_SIZE": ("pool_size", int, 5),
+    "MAX_OVERFLOW": ("max_overflow", int, 10),
+    "POOL_TIMEOUT": ("pool_timeout", float, 30.0),
+    "POOL_RECYCLE": ("pool_recycle", int, -1),
+    "PRE_PING": ("pool_pre_ping", bool, True),
+}
+
+
+def options(prefix):
+    """
+    Returns the create_engine() pool keyword arguments set by the
+    environment variables starting with prefix
+
+    Raises:
+        ValueError: for a value that is not a number
+    """
+    kwargs = {}
+    for suffix, (name, kind, default) in settings.items():
+        raw = os.getenv(prefix + suffix) or ""
+        if not raw:
+            kwargs[name] = default
+        elif kind is bool:
+            kwargs[name] = raw.lower() in ("1", "true", "yes")
+        else:
+            kwargs[name] = kind(raw)
+    return kwargs
+
+
+class MeteredPool(QueuePool):
+    """
+    QueuePool that times how long each checkout waits for a connection
+
+    Attributes:
+        metrics (Metrics):  receives the wait times, or None
+    """
+    metrics = None
+
+    def _do_get(self):
+        """
+        Checks a connection out of the queue, recording the wait
+        """
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.timed_out()
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.waited(time.perf_counter() - start)
+
+    def recreate(self):
+        """
+        Returns a new pool (after dispose()) reporting to the same metrics
+        """
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class Metrics:
+    """
+    Live connection pool telemetry for one engine
+
+    Attributes:
+        checkouts (int):    connections handed out
+        checked_out (int):  connections in use now
+        peak (int):         most connections in use at once
+        connects (int):     new database connections opened
+        overflows (int):    connections opened beyond the pool size
+        invalidations (int): connections discarded as broken or stale
+        timeouts (int):     checkouts that gave up waiting
+        wait_total (float): seconds spent waiting for checkouts
+        wait_max (float):   longest single wait, in seconds
+
+    Methods:
+        attach(self, engine): starts counting an engine's pool events
+        snapshot(self):     returns the counters and the pool's state
+    """
+
+    def __init__(self):
+        """
+        Initializes zeroed counters
+        """
+        self.__lock = threading.Lock()
+        self.__engine = None
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak = 0
+        self.connects = 0
+        self.overflows = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def attach(self, engine):
+        """
+        Listens to the events of an engine's pool (and of the pools that
+        replace it after dispose())
+        """
+        self.__engine = engine
+        if isinstance(engine.pool, MeteredPool):
+            engine.pool.metrics = self
+        event.listen(engine, "connect", self.__connect)
+        event.listen(engine, "checkout", self.__checkout)
+        event.listen(engine, "checkin", self.__checkin)
+        event.listen(engine, "invalidate", self.__invalidate)
+        event.listen(engine, "soft_invalidate", self.__invalidate)
+        return self
+
+    def waited(self, seconds):
+        """
+        Records the time one checkout spent waiting
+        """
+        with self.__lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def timed_out(self):
+        """
+        Records a checkout that hit the pool timeout
+        """
+        with self.__lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        """
+        Returns the counters with the pool's current size, connections
+        in use and overflow
+        """
+        with self.__lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "checked_out": self.checked_out,
+                "peak": self.peak,
+                "connects": self.connects,
+                "overflows": self.overflows,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_total": self.wait_total,
+                "wait_max": self.wait_max,
+                "wait_avg": self.wait_total /
+                (self.checkouts + self.timeouts) if self.checkouts or
+                self.timeouts else 0.0}
+        pool = self.__engine and self.__engine.pool
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), idle=pool.checkedin(),
+                         overflow=max(pool.overflow(), 0))
+        return stats
+
+    def __connect(self, dbapi_connection, connection_record):
+        """
+        Counts a new connection, and an overflow one past the pool size
+        """
+        pool = self.__engine.pool
+        with self.__lock:
+            self.connects += 1
+            if isinstance(pool, QueuePool) and pool.overflow() > 0:
+                self.overflows += 1
+
+    def __checkout(self, dbapi_connection, connection_record,
+                   connection_proxy):
+        """
+        Counts a connection handed out
+        """
+        with self.__lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak = max(self.peak, self.checked_out)
+
+    def __checkin(self, dbapi_connection, connection_record):
+        """
+        Counts a connection returned
+        """
+        with self.__lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def __invalidate(self, dbapi_connection, connection_record,
+                     exception):
+        """
+        Counts a connection discarded
+        """
+        with self.__lock:
+            self.invalidations += 1
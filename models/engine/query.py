@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""
+This module contains the criteria parsing shared by the storage engines'
+find() and explain() methods.
+
+Criteria are keyword arguments naming an attribute, optionally followed
+by "__" and an operator:
+
+    name="Texas"                    equality (also name__eq)
+    name__ne="Texas"                inequality
+    state_id__in=[id1, id2]         membership
+    price_by_night__gte=100         range: gt, gte, lt, lte
+    amenity_ids__contains=wifi_id   list attribute holding a value
+
+Objects whose attribute is missing or None never satisfy a range test.
+"""
+
+OPERATORS = ("eq", "ne", "in", "gt", "gte", "lt", "lte", "contains")
+
+
+def parse(criteria):
+    """
+    Returns the (attribute, operator, value) conditions for criteria
+
+    Raises:
+        ValueError: for an unknown operator
+    """
+    conditions = []
+    for name, value in criteria.items():
+        attribute, _, op = name.rpartition("__")
+        if not attribute:
+            attribute, op = name, "eq"
+        elif op not in OPERATORS:
+            raise ValueError("unknown operator: {}".format(name))
+        if op == "in":
+            value = list(value)
+        conditions.append((attribute, op, value))
+    return conditions
+
+
+def check(cls, conditions, order_by=None):
+    """
+    Checks that cls is a class and has every attribute that conditions
+    and order_by name, as DBStorage checks them against its columns
+
+    Raises:
+        ValueError: for an unknown class or attribute
+    """
+    if cls is None:
+        raise ValueError("unknown class")
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    names = [name for name, _, _ in conditions]
+    names.extend(name.lstrip("-") for name in order_by or ())
+    for name in names:
+        if not hasattr(cls, name):
+            raise ValueError("unknown attribute: {}".format(name))
+
+
+def test(value, op, operand):
+    """
+    Returns True if an attribute value satisfies one condition
+    """
+    if op == "eq":
+        return value == operand
+    if op == "ne":
+        return value != operand
+    if op == "in":
+        return value in operand
+    if op == "contains":
+        return isinstance(value, (list, tuple, set, frozenset)) and \
+            operand in value
+    if value is None:
+        return False
+    try:
+        if op == "gt":
+            return value > operand
+        if op == "gte":
+            return value >= operand
+        if op == "lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+
+def matches(obj, conditions):
+    """
+    Returns True if an object satisfies every condition
+    """
+    return all(test(getattr(obj, name, None), op, operand)
+               for name, op, operand in conditions)
+
+
+def order(objs, order_by):
+    """
+    Returns objs sorted by one attribute name or a list of them; a name
+    prefixed with "-" sorts descending, and None sorts first
+    """
+    objs = list(objs)
+    if not order_by:
+        return objs
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    for name in reversed(order_by):
+        descending = name.startswith("-")
+        name = name.lstrip("-")
+        objs.sort(key=lambda obj: (getattr(obj, name, None) is not None,
+                                   getattr(obj, name, None)),
+                  reverse=descending)
+    return objs
+
+
+def page(objs, offset=0, limit=None):
+    """
+    Returns the slice of objs selected by offset and limit
+    """
+    offset = offset or 0
+    return objs[offset:None if limit is None else offset + limit]
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""
+This module contains the read-replica routing used by DBStorage.
+
+A RoutingSession sends writes (flushes, bulk INSERT/UPDATE/DELETE) to the
+primary engine and reads to a replica chosen by the Router. Once a
+session has written, its reads stay on the primary until the transaction
+ends, and for `sticky` seconds after a commit the thread that committed
+keeps reading from the primary too, so it reads its own writes while the
+replicas catch up. A replica is chosen once per transaction, so the reads
+of one transaction see one database.
+"""
+import threading
+import time
+from sqlalchemy import Delete, Insert, Update, event
+from sqlalchemy.orm import Session
+
+policies = ("round_robin", "least_loaded")
+
+
+class Router:
+    """
+    Chooses the engine each statement of a RoutingSession runs on
+
+    Attributes:
+        primary (Engine):   engine taking writes
+        replicas (list):    (engine, pool.Metrics) pairs taking reads
+        policy (str):       "round_robin" or "least_loaded" (fewest
+                            connections checked out)
+        sticky (float):     seconds reads stay on the primary after a
+                            commit that wrote
+
+    Methods:
+        bind(self, session, clause): returns the engine for a statement
+        replica(self):      returns the next replica engine
+        pinned(self):       checks if this thread reads from the primary
+    """
+
+    def __init__(self, primary, replicas, policy="round_robin", sticky=1.0):
+        """
+        Initializes a router
+
+        Raises:
+            ValueError: for an unknown policy
+        """
+        if policy not in policies:
+            raise ValueError("unknown replica policy: {}".format(policy))
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.policy = policy
+        self.sticky = sticky
+        self.__next = -1
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def bind(self, session, clause=None):
+        """
+        Returns the engine a session statement runs on, remembering in
+        session.info that the session wrote or which replica it reads
+        """
+        if session._flushing or isinstance(clause, (Insert, Update, Delete)):
+            session.info["writing"] = True
+        if session.info.get("writing") or self.pinned():
+            return self.primary
+        if "replica" not in session.info:
+            session.info["replica"] = self.replica()
+        return session.info["replica"]
+
+    def replica(self):
+        """
+        Returns the replica engine for a new read transaction
+        """
+        with self.__lock:
+            if self.policy == "least_loaded":
+                start = self.__next + 1
+                order = self.replicas[start:] + self.replicas[:start]
+                engine, _ = min(order, key=lambda pair: pair[1].checked_out)
+                self.__next = self.replicas.index(
+                    next(pair for pair in self.replicas
+                         if pair[0] is engine))
+                return engine
+            self.__next = (self.__next + 1) % len(self.replicas)
+            return self.replicas[self.__next][0]
+
+    def pinned(self):
+        """
+        Checks if this thread committed a write less than sticky seconds
+        ago
+        """
+        committed = getattr(self.__local, "committed", None)
+        return committed is not None and \
+            time.monotonic() - committed < self.sticky
+
+    def watch(self, session_factory):
+        """
+        Listens to the transactions of the sessions a factory makes
+        """
+        event.listen(session_factory, "after_commit", self.__after_commit)
+        event.listen(session_factory, "after_transaction_end",
+                     self.__after_transaction_end)
+        return self
+
+    def __after_commit(self, session):
+        """
+        Starts the read-your-writes window after a commit that wrote
+        """
+        if session.info.get("writing"):
+            self.__local.committed = time.monotonic()
+
+    def __after_transaction_end(self, session, transaction):
+        """
+        Forgets the session's replica and writes when its outermost
+        transaction ends
+        """
+        if transaction.parent is None:
+            session.info.pop("writing", None)
+            session.info.pop("replica", None)
+
+
+class RoutingSession(Session):
+    """
+    Session whose statements run on the engine its router chooses
+    """
+
+    def __init__(self, router=None, **kwargs):
+        """
+        Initializes a session routed by router
+        """
+        super().__init__(**kwargs)
+        self.router = router
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """
+        Returns the primary for writes and a replica for reads
+        """
+        if self.router is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return self.router.bind(self, clause)
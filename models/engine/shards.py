@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""
+This module contains the Shards class.
+"""
+import os
+import zlib
+
+
+class Shards:
+    """
+    Sharded on-disk layout for FileStorage: a directory holding one file
+    per class, with large classes optionally split into hash shards by id
+
+    A shard is named after its class ("User") or, for a class split into
+    n shards, after its class and shard number ("Review.3").
+
+    Attributes:
+        directory (str):    directory holding the shard files
+        extension (str):    shard file extension (from the codec)
+        counts (dict):      class name -> number of shards ("*" for all)
+
+    Methods:
+        name(self, key):    returns the shard holding a key
+        path(self, name):   returns the file path of a shard
+        stamp(self):        returns the identity of every shard file
+        parse(spec):        parses HBNB_FILE_SHARDS
+    """
+
+    def __init__(self, directory, extension, counts=None):
+        """
+        Initializes the layout
+        """
+        self.directory = directory
+        self.extension = extension
+        self.counts = counts or {}
+
+    def name(self, key):
+        """
+        Returns the name of the shard holding <class name>.id
+        """
+        class_name, _, obj_id = key.partition(".")
+        count = self.counts.get(class_name, self.counts.get("*", 1))
+        if count <= 1:
+            return class_name
+        return "{}.{}".format(class_name,
+                              zlib.crc32(obj_id.encode("utf-8")) % count)
+
+    def path(self, name):
+        """
+        Returns the file path of a shard
+        """
+        return os.path.join(self.directory, name + self.extension)
+
+    def stamp(self):
+        """
+        Returns shard name -> (inode, size, mtime) for every shard file
+        """
+        stamp = {}
+        try:
+            entries = os.scandir(self.directory)
+        except FileNotFoundError:
+            return stamp
+        with entries:
+            for entry in entries:
+                if entry.name.endswith(self.extension) and entry.is_file():
+                    stat = entry.stat()
+                    stamp[entry.name[:-len(self.extension)]] = (
+                        stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        return stamp
+
+    @staticmethod
+    def parse(spec):
+        """
+        Parses a shard count specification
+
+        "8" splits every class into 8 shards; "Review=16,Place=4" only
+        splits the classes listed.
+
+        Raises:
+            ValueError: if the specification is malformed
+        """
+        counts = {}
+        for part in (spec or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "=" in part:
+                class_name, count = part.split("=", 1)
+                counts[class_name.strip()] = int(count)
+            else:
+                counts["*"] = int(part)
+        return counts
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+"""
+This module defines the SQLiteStorage class.
+"""
+import os
+from sqlalchemy import create_engine, event
+from models.engine import pool
+from models.engine.db_storage import DBStorage
+
+
+class SQLiteStorage(DBStorage):
+    """
+    DBStorage on an embedded SQLite database, needing no server
+
+    The models, queries and bulk operations are DBStorage's. A database
+    file is opened in WAL mode, so readers do not block the writer and a
+    commit appends to the log instead of rewriting pages, with the
+    pragmas below set on every connection. ":memory:" opens an in-memory
+    database in shared-cache mode instead, so that every pooled
+    connection sees the same data for as long as the pool holds one.
+    Shared-cache connections lock whole tables, so a thread's open read
+    transaction holds back other threads' writes until it ends (close()).
+
+    Attributes:
+        __file_path (str):  path to the database file
+        pragmas (dict):     PRAGMA name -> value set on each connection
+
+    Methods:
+        engine_for(self, url): creates the SQLite engine
+    """
+    __file_path = "file.db"
+
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+        "mmap_size": 268435456,
+    }
+
+    def __init__(self, file_path=None):
+        """
+        Initializes the database connection
+
+        Args:
+            file_path (str):    database file, or ":memory:" (default:
+                                HBNB_SQLITE_PATH or file.db)
+        """
+        if file_path is None:
+            file_path = os.getenv("HBNB_SQLITE_PATH") or self.__file_path
+        self.__file_path = file_path
+        if file_path == ":memory:":
+            url = "sqlite:///file:hbnb-{}?mode=memory&cache=shared&uri=true" \
+                .format(id(self))
+        else:
+            url = "sqlite:///" + file_path
+        super().__init__(url=url, replicas=[])
+
+    def engine_for(self, url):
+        """
+        Returns an engine for url with the pool configured by the
+        HBNB_SQLITE_* variables (pre-ping is off unless set, as there is
+        no connection to lose) and the pragmas applied on connect
+        """
+        options = pool.options("HBNB_SQLITE_")
+        if not os.getenv("HBNB_SQLITE_PRE_PING"):
+            options["pool_pre_ping"] = False
+        engine = create_engine(url, poolclass=pool.MeteredPool,
+                               connect_args={"check_same_thread": False},
+                               **options)
+        event.listen(engine, "connect", self.__configure)
+        event.listen(engine, "begin", self.__begin)
+        return engine
+
+    def __configure(self, dbapi_connection, connection_record):
+        """
+        Sets the pragmas on a new connection and leaves transactions to
+        SQLAlchemy, so that SAVEPOINTs (nested transaction() blocks) work
+        """
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        pragmas = dict(self.pragmas)
+        if self.__file_path == ":memory:":
+            # an in-memory database has no WAL to switch to
+            del pragmas["journal_mode"]
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
+        cursor.close()
+
+    @staticmethod
+    def __begin(connection):
+        """
+        Starts each transaction, which the driver no longer does
+        """
+        connection.exec_driver_sql("BEGIN")
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""
+This module contains the timestamp codec shared by BaseModel and the
+storage engines.
+
+Timestamps are stored as "%Y-%m-%dT%H:%M:%S.%f" strings (or as integer
+microseconds since the epoch by the binary codec). The helpers here avoid
+strptime/strftime on the load and save paths, and the Timestamp
+descriptor lets a model keep the stored string until the attribute is
+actually read.
+"""
+from datetime import datetime, timedelta
+
+time_format = "%Y-%m-%dT%H:%M:%S.%f"
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+DAY = 86400 * 1000000
+_dates = {}
+
+
+def parse(value):
+    """
+    Returns the datetime for a stored timestamp string
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, time_format)
+
+
+def format(moment):
+    """
+    Returns the stored string for a datetime
+    """
+    if moment.tzinfo is None and moment.year >= 1000:
+        return moment.isoformat(timespec="microseconds")
+    return moment.strftime(time_format)
+
+
+def stored(value):
+    """
+    Returns the stored string for a datetime or a stored string
+    """
+    return value if isinstance(value, str) else format(value)
+
+
+def to_micros(value):
+    """
+    Returns a timestamp string as microseconds since the epoch, or None
+    if the string would not come back unchanged from from_micros()
+    """
+    if len(value) != 26:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is not None or moment.year < 1000:
+        return None
+    micros = (moment - EPOCH) // MICROSECOND
+    return micros if from_micros(micros) == value else None
+
+
+def from_micros(micros):
+    """
+    Returns the stored string for microseconds since the epoch
+
+    The date part is cached per day, since stored objects cluster on a
+    small number of days.
+    """
+    days, micros = divmod(micros, DAY)
+    date = _dates.get(days)
+    if date is None:
+        date = _dates[days] = (EPOCH + timedelta(days=days)).strftime(
+            "%Y-%m-%d")
+    seconds, micros = divmod(micros, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%sT%02d:%02d:%02d.%06d" % (date, hours, minutes, seconds,
+                                       micros)
+
+
+class Timestamp:
+    """
+    Descriptor for created_at/updated_at on file-storage models
+
+    A stored string assigned to the attribute is kept as is, so an object
+    that is loaded and saved again without its timestamps being read
+    never converts them; the string is parsed on first read.
+
+    Attributes:
+        name (str):         attribute name
+        default (datetime): value when the instance has none
+
+    Methods:
+        resolve(cls, obj): parses the stored strings obj still holds
+    """
+
+    def __init__(self, default=None):
+        """
+        Initializes the descriptor
+        """
+        self.default = default if default is not None else \
+            datetime.utcnow()
+
+    def __set_name__(self, owner, name):
+        """
+        Records the attribute name
+        """
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        """
+        Returns the datetime, parsing a stored string on first read
+        """
+        if obj is None:
+            return self.default
+        value = obj.__dict__.get(self.name, self.default)
+        if isinstance(value, str):
+            value = obj.__dict__[self.name] = parse(value)
+        return value
+
+    def __set__(self, obj, value):
+        """
+        Stores a datetime or a stored string
+        """
+        obj.__dict__[self.name] = value
+
+    @classmethod
+    def resolve(cls, obj):
+        """
+        Parses the stored strings still held for obj's Timestamp
+        attributes, so that its __dict__ holds only datetimes
+        """
+        for klass in type(obj).__mro__:
+            for name, value in vars(klass).items():
+                if isinstance(value, cls) and \
+                        isinstance(obj.__dict__.get(name), str):
+                    value.__get__(obj)
@@ -9,7 +9,7 @@ from models.city import City
 from models.user import User
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):
     from sqlalchemy import Column, String, Integer, Float, Table, ForeignKey
     from sqlalchemy.orm import relationship
     from models.base_model import Base
@@ -46,10 +46,12 @@ if getenv("HBNB_TYPE_STORAGE") == "db":
         __tablename__ = "places"
         city_id = Column(String(60),
                          ForeignKey("cities.id"),
-                         nullable=False)
+                         nullable=False,
+                         index=True)
         user_id = Column(String(60),
                          ForeignKey("users.id"),
-                         nullable=False)
+                         nullable=False,
+                         index=True)
         name = Column(String(128),
                       nullable=False)
         description = Column(String(1024),
@@ -95,12 +97,7 @@ if getenv("HBNB_TYPE_STORAGE") == "db":
                 return
 
             # Check if given city id exists in database
-            city_exists = False
-            for city in models.storage.all(City).values():
-                if city.id == self.city_id:
-                    city_exists = True
-                    break
-            if not city_exists:
+            if not models.storage.exists(City, self.city_id):
                 print("** city with that id does not exist **")
                 return
 
@@ -110,12 +107,7 @@ if getenv("HBNB_TYPE_STORAGE") == "db":
                 return
 
             # Check if given user id exists in database
-            user_exists = False
-            for user in models.storage.all(User).values():
-                if user.id == self.user_id:
-                    user_exists = True
-                    break
-            if not user_exists:
+            if not models.storage.exists(User, self.user_id):
                 print("** user with that id does not exist **")
                 return
 
@@ -143,7 +135,10 @@ else:
             latitude (float):       latitude (optional)
             longitude (float):      longitude (optional)
             reviews (list):         Review instances of Place
-            amenity_ids (list):     Amenity instances of Place
+            amenity_ids (list):     ids of the Amenity instances of Place,
+                                    each stored once; storage indexes them
+                                    so Places with a set of Amenities are
+                                    found with storage.having()
         """
         city_id = None
         user_id = None
@@ -162,32 +157,34 @@ else:
             """
             Returns list of Review instances linked to Place
             """
-            return [review for review
-                    in models.storage.all("Review").values()
-                    if review.place_id == self.id]
+            return models.storage.children("Review", "place_id", self.id)
 
         @property
         def amenities(self):
             """
             Returns list of Amenity instances linked to Place
             """
-            return [amenity for amenity
-                    in models.storage.all("Amenity").values()
-                    if amenity.id in self.amenity_ids]
+            amenities = (models.storage.get("Amenity", amenity_id)
+                         for amenity_id in self.amenity_ids)
+            return [amenity for amenity in amenities if amenity is not None]
 
         @amenities.setter
         def amenities(self, obj):
             """
             Sets amenity_ids when adding an Amenity to Place
             """
-            if isinstance(obj, models.Amenity):
-                self.amenity_ids.append(obj.id)
+            if type(obj).__name__ == "Amenity" and \
+                    obj.id not in self.amenity_ids:
+                # reassigned so storage sees the change and reindexes it
+                self.amenity_ids = self.amenity_ids + [obj.id]
 
         def __init__(self, *args, **kwargs):
             """
             Initializes a place
             """
             super().__init__(*args, **kwargs)
+            if "amenity_ids" not in self.__dict__:
+                self.amenity_ids = []
 
         def save(self):
             """
@@ -200,12 +197,7 @@ else:
                 return
 
             # Check if given city id exists in database
-            city_exists = False
-            for city in models.storage.all(City).values():
-                if city.id == self.city_id:
-                    city_exists = True
-                    break
-            if not city_exists:
+            if not models.storage.exists(City, self.city_id):
                 print("** city with that id does not exist **")
                 return
 
@@ -215,12 +207,7 @@ else:
                 return
 
             # Check if given user id exists in database
-            user_exists = False
-            for user in models.storage.all(User).values():
-                if user.id == self.user_id:
-                    user_exists = True
-                    break
-            if not user_exists:
+            if not models.storage.exists(User, self.user_id):
                 print("** user with that id does not exist **")
                 return
 
@@ -9,7 +9,7 @@ from models.place import Place
 from models.user import User
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):  # database storage
     from sqlalchemy import Column, String, ForeignKey
     from models.base_model import Base
 
@@ -25,10 +25,12 @@ if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
         __tablename__ = "reviews"
         place_id = Column(String(60),
                           ForeignKey("places.id"),
-                          nullable=False)
+                          nullable=False,
+                          index=True)
         user_id = Column(String(60),
                          ForeignKey("users.id"),
-                         nullable=False)
+                         nullable=False,
+                         index=True)
         text = Column(String(1024),
                       nullable=False)
 
@@ -49,12 +51,7 @@ if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
                 return
 
             # Check if given place id exists in database
-            place_exists = False
-            for city in models.storage.all(Place).values():
-                if city.id == self.place_id:
-                    place_exists = True
-                    break
-            if not place_exists:
+            if not models.storage.exists(Place, self.place_id):
                 print("** place with that id does not exist **")
                 return
 
@@ -64,12 +61,7 @@ if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
                 return
 
             # Check if given user id exists in database
-            user_exists = False
-            for user in models.storage.all(User).values():
-                if user.id == self.user_id:
-                    user_exists = True
-                    break
-            if not user_exists:
+            if not models.storage.exists(User, self.user_id):
                 print("** user with that id does not exist **")
                 return
 
@@ -111,12 +103,7 @@ else:
                 return
 
             # Check if given place id exists in database
-            place_exists = False
-            for place in models.storage.all(Place).values():
-                if place.id == self.place_id:
-                    place_exists = True
-                    break
-            if not place_exists:
+            if not models.storage.exists(Place, self.place_id):
                 print("** place with that id does not exist **")
                 return
 
@@ -126,12 +113,7 @@ else:
                 return
 
             # Check if given user id exists in database
-            user_exists = False
-            for user in models.storage.all(User).values():
-                if user.id == self.user_id:
-                    user_exists = True
-                    break
-            if not user_exists:
+            if not models.storage.exists(User, self.user_id):
                 print("** user with that id does not exist **")
                 return
 
@@ -7,7 +7,7 @@ from models.base_model import BaseModel
 from os import getenv
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":  # database storage
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):  # database storage
     from sqlalchemy import Column, String
     from sqlalchemy.orm import relationship
     from models.base_model import Base
@@ -62,8 +62,7 @@ else:
             """
             returns list of City instances in state
             """
-            return [city for city in models.storage.all("City").values()
-                    if city.state_id == self.id]
+            return models.storage.children("City", "state_id", self.id)
 
         def __init__(self, *args, **kwargs):
             """
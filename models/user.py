@@ -2,11 +2,12 @@
 """
 This module contains the User class for both file and database storage.
 """
+import models
 from os import getenv
 from models.base_model import BaseModel
 
 
-if getenv("HBNB_TYPE_STORAGE") == "db":
+if getenv("HBNB_TYPE_STORAGE") in ("db", "sqlite"):
     from models.base_model import Base
     from sqlalchemy import Column, String
     from sqlalchemy.orm import relationship
@@ -70,12 +71,28 @@ else:
             password (str):     password
             first_name (str):   first name (optional)
             last_name (str):    last name (optional)
+            places (list):      Place instances of User
+            reviews (list):     Review instances of User
         """
         email = None
         password = None
         first_name = None
         last_name = None
 
+        @property
+        def places(self):
+            """
+            Returns list of Place instances owned by User
+            """
+            return models.storage.children("Place", "user_id", self.id)
+
+        @property
+        def reviews(self):
+            """
+            Returns list of Review instances written by User
+            """
+            return models.storage.children("Review", "user_id", self.id)
+
         def __init__(self, *args, **kwargs):
             """
             initializes a user
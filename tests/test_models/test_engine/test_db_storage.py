@@ -2,10 +2,17 @@
 """
 This module contains tests for the DBStorage class.
 """
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch
 from models.engine.db_storage import DBStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.base_model import Base
 from models.user import User
+from models.state import State
+from models.city import City
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 import os
@@ -27,7 +34,12 @@ class test_DBStorage(unittest.TestCase):
         os.environ["HBNB_MYSQL_HOST"] = "localhost"
         os.environ["HBNB_MYSQL_DB"] = "hbnb_test_db"
 
-        cls.storage = DBStorage()
+        # HBNB_TYPE_STORAGE=sqlite runs these tests on an in-memory
+        # SQLite database instead of MySQL
+        if os.getenv("HBNB_TYPE_STORAGE") == "sqlite":
+            cls.storage = SQLiteStorage(":memory:")
+        else:
+            cls.storage = DBStorage()
         cls.storage.reload()
         cls.session = cls.storage._DBStorage__session
 
@@ -75,6 +87,189 @@ class test_DBStorage(unittest.TestCase):
         self.assertIsNotNone(saved_user)
         self.assertEqual(saved_user.email, "save_test@hbnb.com")
 
+    def test_get(self):
+        """
+        Tests if get() returns one object by class and id
+        """
+        user = User(email="get_test@hbnb.com", password="test_pwd")
+        self.storage.new(user)
+        self.storage.save()
+        self.assertIs(self.storage.get(User, user.id), user)
+        self.assertIs(self.storage.get("User", user.id), user)
+        self.assertIsNone(self.storage.get(User, "nope"))
+        self.assertIsNone(self.storage.get("Nope", user.id))
+
+    def test_exists(self):
+        """
+        Tests if exists() and missing() probe primary keys
+        """
+        user = User(email="exists_test@hbnb.com", password="test_pwd")
+        self.storage.new(user)
+        self.storage.save()
+        self.assertTrue(self.storage.exists(User, user.id))
+        self.assertFalse(self.storage.exists("User", "nope"))
+        self.assertEqual(self.storage.missing(User, [user.id, "nope"]),
+                         {"nope"})
+
+    def test_iter(self):
+        """
+        Tests if iter() streams the stored objects
+        """
+        user = User(email="iter_test@hbnb.com", password="test_pwd")
+        self.storage.new(user)
+        self.storage.save()
+        self.assertIn(user, list(self.storage.iter(User, batch_size=1)))
+        self.assertEqual(len(list(self.storage.iter())),
+                         self.storage.count())
+
+    def test_save_many(self):
+        """
+        Tests if save_many() inserts instances and dictionaries at once
+        """
+        ids = self.storage.save_many(
+            [User(email="bulk1@hbnb.com", password="test_pwd"),
+             {"email": "bulk2@hbnb.com", "password": "test_pwd"}], User)
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.storage.missing(User, ids), set())
+        with self.assertRaises(ValueError):
+            self.storage.new_many([{"__class__": "Review",
+                                    "user_id": "nope", "place_id": "nope",
+                                    "text": "x"}])
+
+    def test_delete_many(self):
+        """
+        Tests if delete_many() removes objects in one transaction
+        """
+        ids = self.storage.save_many(
+            [{"email": "gone@hbnb.com", "password": "test_pwd"},
+             {"email": "gone@hbnb.com", "password": "test_pwd"}], User)
+        users = [self.storage.get(User, obj_id) for obj_id in ids]
+        self.assertEqual(self.storage.delete_many(users), 2)
+        self.assertEqual(self.storage.missing(User, ids), set(ids))
+
+    def test_find(self):
+        """
+        Tests if find() compiles criteria into one query
+        """
+        user = User(email="find_test@hbnb.com", password="test_pwd")
+        self.storage.new(user)
+        self.storage.save()
+        self.assertEqual(self.storage.find(User, email="find_test@hbnb.com"),
+                         [user])
+        self.assertEqual(self.storage.find("User", id__in=[user.id],
+                                           email__ne="find_test@hbnb.com"),
+                         [])
+        self.assertIn("WHERE", self.storage.explain(User, id=user.id))
+        with self.assertRaises(ValueError):
+            self.storage.find(User, nope=1)
+        with self.assertRaises(ValueError):
+            self.storage.find(User, order_by="-nope")
+
+    def test_transaction(self):
+        """
+        Tests if transaction() commits once and rolls back on error
+        """
+        kept = User(email="kept@hbnb.com", password="test_pwd")
+        lost = User(email="lost@hbnb.com", password="test_pwd")
+        with self.storage.transaction():
+            self.storage.new(kept)
+            self.storage.save()
+            with self.assertRaises(KeyError):
+                with self.storage.transaction():
+                    self.storage.new(lost)
+                    raise KeyError
+        self.assertTrue(self.storage.exists(User, kept.id))
+        self.assertFalse(self.storage.exists(User, lost.id))
+
+    def test_transaction_threads(self):
+        """
+        Tests if a block open in one thread does not hold back the
+        commits of another thread's session
+        """
+        ids = []
+
+        def other():
+            ids.extend(self.storage.save_many(
+                [{"email": "thread@hbnb.com", "password": "test_pwd"}],
+                User))
+            self.session.remove()
+
+        # ends the reads left open by earlier tests, which lock their
+        # tables on an in-memory SQLite database
+        self.storage.close()
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                thread = threading.Thread(target=other)
+                thread.start()
+                thread.join()
+                raise KeyError
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(self.storage.missing(User, ids), set())
+
+    def test_load(self):
+        """
+        Tests if all(), get() and find() load relationships eagerly
+        """
+        state = State(name="Eager")
+        self.storage.new(state)
+        self.storage.new(City(name="Loaded", state_id=state.id))
+        self.storage.save()
+        self.storage.close()
+        loaded = self.storage.get(State, state.id, load="cities")
+        self.assertIn("cities", loaded.__dict__)
+        self.assertEqual(len(loaded.cities), 1)
+        self.storage.close()
+        states = self.storage.find(State, name="Eager",
+                                   load={"cities.places": "joined"})
+        self.assertIn("cities", states[0].__dict__)
+        self.assertIn(f"State.{state.id}",
+                      self.storage.all(State, load=["cities"]))
+        with self.assertRaises(ValueError):
+            self.storage.all(State, load="nope")
+        with self.assertRaises(ValueError):
+            self.storage.all(State, load={"cities": "eager"})
+
+    def test_columns(self):
+        """
+        Tests if all(columns=...) reads column subsets in one query
+        """
+        user = User(email="columns@hbnb.com", password="test_pwd")
+        self.storage.new(user)
+        self.storage.save()
+        rows = self.storage.all(columns=["email", "updated_at"])
+        self.assertEqual(rows[f"User.{user.id}"]["email"],
+                         "columns@hbnb.com")
+        self.assertEqual(len(rows), self.storage.count())
+        self.assertEqual(set(self.storage.all(User, columns=["id"])),
+                         set(self.storage.all(User)))
+        with self.assertRaises(ValueError):
+            self.storage.all(columns=["nope"])
+
+    def test_count(self):
+        """
+        Tests if count() counts rows without loading them
+        """
+        before = self.storage.count(User)
+        user = User(email="count_test@hbnb.com", password="test_pwd")
+        self.storage.new(user)
+        self.storage.save()
+        self.assertEqual(self.storage.count("User"), before + 1)
+        self.assertGreaterEqual(self.storage.count(), before + 1)
+        stats = self.storage.stats()
+        self.assertEqual(stats["User"]["count"], before + 1)
+        self.assertGreaterEqual(stats["User"]["updated_at"],
+                                user.updated_at)
+
+    def test_pool_stats(self):
+        """
+        Tests if pool_stats() reports the connection pool metrics
+        """
+        self.storage.count(User)
+        stats = self.storage.pool_stats()
+        self.assertGreaterEqual(stats["checkouts"], 1)
+        self.assertIn("wait_max", stats)
+        self.assertIn("invalidations", stats)
+
     def test_delete(self):
         """
         Tests if delete() deletes an object from __objects
@@ -96,5 +291,57 @@ class test_DBStorage(unittest.TestCase):
         self.assertIsInstance(obj_dict, dict)
 
 
+class test_DBStorage_replicas(unittest.TestCase):
+    """
+    Tests DBStorage reading from a replica, with SQLite files standing in
+    for the primary and replica databases
+    """
+    def setUp(self):
+        """
+        Creates the primary and a replica holding one state of its own
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        primary, replica = ("sqlite:///" + os.path.join(self.tmp.name, name)
+                            for name in ("primary.db", "replica.db"))
+        engine = create_engine(replica)
+        Base.metadata.create_all(engine)
+        with sessionmaker(bind=engine).begin() as session:
+            session.add(State(name="Replica"))
+        engine.dispose()
+        with patch.dict(os.environ, {"HBNB_MYSQL_STICKY": "0.1"}):
+            self.storage = DBStorage(url=primary, replicas=[replica])
+        self.storage.reload()
+
+    def tearDown(self):
+        """
+        Closes the storage and removes the databases
+        """
+        self.storage.close()
+        self.tmp.cleanup()
+
+    def names(self):
+        """
+        Returns the names of the states a fresh session reads
+        """
+        names = [state.name for state in self.storage.all(State).values()]
+        self.storage.close()
+        return names
+
+    def test_read_after_write(self):
+        """
+        Tests if a read right after a write goes to the primary, and
+        later reads to the replica
+        """
+        self.assertEqual(self.names(), ["Replica"])
+        self.storage.new(State(name="Primary"))
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(self.names(), ["Primary"])
+        time.sleep(0.15)
+        self.assertEqual(self.names(), ["Replica"])
+        replica = self.storage.pool_stats()["replicas"][0]
+        self.assertGreater(replica["checkouts"], 0)
+
+
 if __name__ == "__main__":
     unittest.main()
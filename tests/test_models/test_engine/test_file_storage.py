@@ -3,9 +3,25 @@
 This module contains tests for the FileStorage module.
 """
 import unittest
+import gc
+import weakref
 import os
+import tempfile
+import threading
+import time
+import json
+from datetime import datetime
+from unittest.mock import patch
+import models
+from models.base_model import BaseModel
 from models.user import User
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.amenity import Amenity
+from models.review import Review
 from models.engine.file_storage import FileStorage
+from models.engine.file_codecs import convert
 
 
 class test_fileStorage(unittest.TestCase):
@@ -93,6 +109,1027 @@ class test_fileStorage(unittest.TestCase):
         obj = storage.all()
         self.assertNotIn(key, obj)
 
+    def test_all_cls(self):
+        """
+        Tests if all(cls) returns only objects of that exact class
+        """
+        storage = FileStorage()
+        user = User()
+        state = State()
+        storage.new(user)
+        storage.new(state)
+        users = storage.all(User)
+        self.assertIn(f"User.{user.id}", users)
+        self.assertNotIn(f"State.{state.id}", users)
+        self.assertIn(f"State.{state.id}", storage.all("State"))
+        self.assertEqual(len(storage.all("Nope")), 0)
+        storage.new(User())
+        for obj in storage.all(User).values():
+            storage.delete(obj)
+        self.assertNotIn(f"User.{user.id}", storage.all(User))
+        self.assertIn(f"User.{user.id}", users)
+        storage.delete(state)
+
+    def test_get(self):
+        """
+        Tests if get() returns one object by class and id
+        """
+        storage = FileStorage()
+        user = User()
+        storage.new(user)
+        self.assertIs(storage.get(User, user.id), user)
+        self.assertIs(storage.get("User", user.id), user)
+        self.assertIsNone(storage.get(State, user.id))
+        self.assertIsNone(storage.get(User, "nope"))
+        storage.delete(user)
+        self.assertIsNone(storage.get(User, user.id))
+
+    def test_exists(self):
+        """
+        Tests if exists() and missing() check ids against storage
+        """
+        storage = FileStorage()
+        user = User()
+        storage.new(user)
+        self.assertTrue(storage.exists(User, user.id))
+        self.assertFalse(storage.exists("State", user.id))
+        self.assertEqual(storage.missing(User, [user.id, "a", "b"]),
+                         {"a", "b"})
+
+    def test_children(self):
+        """
+        Tests if children() follows references as they change
+        """
+        storage = models.storage
+        state, other = State(), State()
+        city = City()
+        city.state_id = state.id
+        storage.new(city)
+        self.assertEqual(state.cities, [city])
+        self.assertEqual(storage.children(City, "state_id", state.id),
+                         [city])
+        city.state_id = other.id
+        self.assertEqual(state.cities, [])
+        self.assertEqual(other.cities, [city])
+        place = Place()
+        place.amenity_ids = ["a", "b"]
+        storage.new(place)
+        self.assertEqual(storage.children(Place, "amenity_ids", "b"),
+                         [place])
+        storage.delete(city)
+        storage.delete(place)
+        self.assertEqual(other.cities, [])
+        self.assertEqual(storage.children(Place, "amenity_ids", "b"), [])
+
+    def test_having(self):
+        """
+        Tests if having() intersects amenity bitmaps
+        """
+        storage = models.storage
+        wifi, pool = Amenity(), Amenity()
+        both, one = Place(), Place()
+        self.assertIsNot(both.amenity_ids, one.amenity_ids)
+        storage.new(both)
+        storage.new(one)
+        both.amenities = wifi
+        both.amenities = pool
+        both.amenities = pool
+        one.amenities = wifi
+        self.assertEqual(both.amenity_ids, [wifi.id, pool.id])
+        self.assertEqual(
+            storage.having(Place, "amenity_ids", [wifi.id, pool.id]),
+            [both])
+        self.assertCountEqual(
+            storage.having("Place", "amenity_ids", [wifi.id]), [both, one])
+        self.assertCountEqual(wifi.place_amenities, [both, one])
+        one.amenity_ids = [pool.id]
+        self.assertCountEqual(
+            storage.having(Place, "amenity_ids", [pool.id]), [both, one])
+        storage.delete(both)
+        self.assertEqual(
+            storage.having(Place, "amenity_ids", [wifi.id, pool.id]), [])
+        self.assertEqual(storage.having(Place, "amenity_ids", ["x"]), [])
+        storage.delete(one)
+
+    def test_find(self):
+        """
+        Tests if find() filters, orders and slices, using indexes
+        """
+        storage = models.storage
+        state = State()
+        cities = []
+        for name in ("c", "a", "b"):
+            city = City()
+            city.name = name
+            city.state_id = state.id
+            storage.new(city)
+            cities.append(city)
+        c, a, b = cities
+        self.assertEqual(storage.find(City, state_id=state.id,
+                                      order_by="name"), [a, b, c])
+        self.assertEqual(storage.find(City, state_id=state.id,
+                                      name__gte="b", order_by="-name"),
+                         [c, b])
+        self.assertEqual(storage.find("City", name__in=["a", "c"],
+                                      state_id=state.id, order_by="name",
+                                      offset=1, limit=1), [c])
+        self.assertEqual(storage.find(City, id=b.id, name="a"), [])
+        self.assertTrue(storage.explain(City, state_id=state.id,
+                                        name="a").startswith(
+            "index City.state_id (3 candidates), then filter on name__eq"))
+        self.assertTrue(storage.explain(City, id=a.id).startswith(
+            "lookup City.id (1 candidates)"))
+        self.assertTrue(storage.explain(City, name="a").startswith(
+            "scan City"))
+        with self.assertRaises(ValueError):
+            storage.find(City, name__like="a")
+        with self.assertRaises(ValueError):
+            storage.find(City, nope=1)
+        with self.assertRaises(ValueError):
+            storage.explain(City, order_by="-nope")
+        self.assertEqual(storage.find(City, state_id=state.id,
+                                      order_by="name", load="state"),
+                         [a, b, c])
+        self.assertIs(storage.get(City, a.id, load="state"), a)
+        for city in cities:
+            storage.delete(city)
+
+    def test_list_in_place(self):
+        """
+        Tests if changing a list attribute in place reindexes it and is
+        saved
+        """
+        for codec in ("json", "binary"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "places")
+                storage = FileStorage(path, codec=codec)
+                wifi, pool = Amenity(), Amenity()
+                place = Place()
+                storage.new(place)
+                storage.save()
+                place.amenity_ids.append(wifi.id)
+                place.amenity_ids += [pool.id]
+                self.assertEqual(storage.children(Place, "amenity_ids",
+                                                  pool.id), [place])
+                self.assertEqual(storage.find(Place,
+                                              amenity_ids__contains=wifi.id),
+                                 [place])
+                storage.save()
+                place.amenity_ids.remove(wifi.id)
+                self.assertEqual(storage.having(Place, "amenity_ids",
+                                                [wifi.id]), [])
+                storage.save()
+                reloaded = FileStorage(path, codec=codec)
+                reloaded.reload()
+                self.assertEqual(
+                    reloaded.get(Place, place.id).amenity_ids, [pool.id])
+
+    def test_find_lists(self):
+        """
+        Tests if find() compares list attributes as whole lists, using
+        the bitmaps only for contains
+        """
+        storage = models.storage
+        wifi, pool = Amenity(), Amenity()
+        place = Place()
+        place.amenity_ids = [wifi.id, pool.id]
+        storage.new(place)
+        self.assertEqual(storage.find(Place, amenity_ids=[wifi.id]), [])
+        self.assertEqual(storage.find(Place,
+                                      amenity_ids=[wifi.id, pool.id]),
+                         [place])
+        self.assertEqual(storage.find(Place, amenity_ids__in=[pool.id]),
+                         [])
+        self.assertEqual(storage.find(Place, amenity_ids__contains=pool.id),
+                         [place])
+        self.assertTrue(storage.explain(Place, amenity_ids=[wifi.id])
+                        .startswith("scan Place"))
+        self.assertTrue(storage.explain(Place, amenity_ids__contains=wifi.id)
+                        .startswith("bitmap Place.amenity_ids"))
+        storage.delete(place)
+
+    def test_count_stats(self):
+        """
+        Tests if count() and stats() report per-class sizes
+        """
+        storage = FileStorage()
+        first, second, state = User(), User(), State()
+        for obj in (first, second, state):
+            storage.new(obj)
+        self.assertEqual(storage.count(), 3)
+        self.assertEqual(storage.count(User), 2)
+        self.assertEqual(storage.count("Amenity"), 0)
+        stats = storage.stats()
+        self.assertEqual(stats["User"]["count"], 2)
+        self.assertEqual(stats["User"]["updated_at"],
+                         max(first.updated_at, second.updated_at))
+        self.assertEqual(stats["Amenity"], {"count": 0, "updated_at": None})
+        first.updated_at = datetime(2100, 1, 1)
+        self.assertEqual(storage.stats()["User"]["updated_at"],
+                         first.updated_at)
+        storage.delete(first)
+        stats = storage.stats()
+        self.assertEqual(stats["User"], {"count": 1,
+                                         "updated_at": second.updated_at})
+
+    def test_save_dirty_only(self):
+        """
+        Tests if save() only re-encodes objects modified since last save
+        """
+        storage = models.storage
+        user = User()
+        other = User()
+        storage.new(user)
+        storage.new(other)
+        storage.save()
+        with patch.object(User, "to_dict", autospec=True,
+                          side_effect=BaseModel.to_dict) as to_dict:
+            user.first_name = "Wu"
+            storage.save()
+            self.assertEqual([c.args[0] for c in to_dict.call_args_list],
+                             [user])
+            storage.save()
+            self.assertEqual(to_dict.call_count, 1)
+        with open("file.json") as file:
+            self.assertEqual(json.load(file)[f"User.{user.id}"]["first_name"],
+                             "Wu")
+        storage.delete(user)
+        storage.delete(other)
+
+    def test_save_dirty_other_storage(self):
+        """
+        Tests if changes reach a storage other than models.storage
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dirty.json")
+            storage = FileStorage(file_path=path)
+            user = User(email="old@hbnb.com")
+            storage.new(user)
+            storage.save()
+            user.email = "new@hbnb.com"
+            storage.save()
+            reloaded = FileStorage(file_path=path)
+            reloaded.reload()
+            self.assertEqual(reloaded.get(User, user.id).email,
+                             "new@hbnb.com")
+
+
+class test_fileStorage_reload(unittest.TestCase):
+    """
+    Tests change-aware FileStorage.reload()
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def check_delta(self, journal):
+        """
+        Checks that a reader only picks up what a writer changed
+        """
+        writer = FileStorage(self.path, journal=journal)
+        kept, changed, gone = User(), User(), User()
+        for user in (kept, changed, gone):
+            writer.new(user)
+        writer.save()
+
+        reader = FileStorage(self.path, journal=journal)
+        reader.reload()
+        before = dict(reader.all())
+        with patch.object(reader._FileStorage__codec, "loads") as loads:
+            reader.close()
+            loads.assert_not_called()
+
+        changed.first_name = "Wu"
+        writer.new(changed)
+        writer.delete(gone)
+        writer.save()
+        reader.close()
+        after = reader.all()
+        self.assertIs(after[f"User.{kept.id}"], before[f"User.{kept.id}"])
+        self.assertEqual(after[f"User.{changed.id}"].first_name, "Wu")
+        self.assertNotIn(f"User.{gone.id}", after)
+        self.assertNotIn(f"User.{gone.id}", reader.all(User))
+
+    def test_snapshot_delta(self):
+        """
+        Tests delta reloads of a plain JSON file
+        """
+        self.check_delta(False)
+
+    def test_journal_delta(self):
+        """
+        Tests delta reloads of a journal
+        """
+        self.check_delta(True)
+
+    def test_unsaved(self):
+        """
+        Tests if a reload keeps the objects changed or deleted since the
+        last save
+        """
+        for journal in (False, True):
+            path = os.path.join(self.tmp.name, f"unsaved{journal}.json")
+            writer = FileStorage(path, journal=journal)
+            gone, changed = User(), User()
+            writer.new(gone)
+            writer.new(changed)
+            writer.save()
+
+            reader = FileStorage(path, journal=journal)
+            reader.reload()
+            reader.delete(reader.get(User, gone.id))
+            local = reader.get(User, changed.id)
+            local.first_name = "Local"
+            reader.new(local)
+            for user in (gone, changed):
+                user.first_name = "Remote"
+                writer.new(user)
+            writer.save()
+            reader.close()
+            self.assertIsNone(reader.get(User, gone.id))
+            self.assertIs(reader.get(User, changed.id), local)
+            self.assertEqual(local.first_name, "Local")
+
+            reader.save()
+            writer.close()
+            self.assertIsNone(writer.get(User, gone.id))
+            self.assertEqual(writer.get(User, changed.id).first_name,
+                             "Local")
+
+
+class test_fileStorage_lazy(unittest.TestCase):
+    """
+    Tests FileStorage in lazy mode
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_lazy_reload(self):
+        """
+        Tests if objects are only built when their class is requested
+        """
+        writer = FileStorage(self.path)
+        user, state = User(), State()
+        state.name = "Texas"
+        writer.new(user)
+        writer.new(state)
+        writer.save()
+
+        storage = FileStorage(self.path, lazy=True)
+        storage.reload()
+        self.assertEqual(storage._FileStorage__objects, {})
+        states = storage.all(State)
+        self.assertEqual(states[f"State.{state.id}"].name, "Texas")
+        self.assertNotIn(f"User.{user.id}", storage._FileStorage__objects)
+        storage.save()
+        with open(self.path) as file:
+            self.assertIn(f"User.{user.id}", json.load(file))
+        self.assertIn(f"User.{user.id}", storage.all())
+
+    def test_lazy_get(self):
+        """
+        Tests if get() builds only the requested object
+        """
+        writer = FileStorage(self.path)
+        first, second = User(), User()
+        writer.new(first)
+        writer.new(second)
+        writer.save()
+
+        storage = FileStorage(self.path, lazy=True)
+        storage.reload()
+        self.assertEqual(storage.get(User, first.id).id, first.id)
+        self.assertEqual(list(storage._FileStorage__objects),
+                         [f"User.{first.id}"])
+        self.assertEqual(len(storage.all(User)), 2)
+
+    def test_lazy_count(self):
+        """
+        Tests if count() and stats() build no objects
+        """
+        writer = FileStorage(self.path)
+        user = User()
+        writer.new(user)
+        writer.save()
+
+        storage = FileStorage(self.path, lazy=True)
+        storage.reload()
+        self.assertEqual(storage.count(User), 1)
+        self.assertTrue(storage.exists(User, user.id))
+        self.assertEqual(storage.missing(User, [user.id]), set())
+        codec = storage._FileStorage__codec
+        with patch.object(codec, "decode", side_effect=AssertionError):
+            self.assertEqual(storage.stats()["User"]["updated_at"],
+                             user.updated_at)
+        self.assertEqual(storage._FileStorage__objects, {})
+
+    def test_lazy_columns(self):
+        """
+        Tests if all(columns=...) reads unbuilt objects from their
+        fragments
+        """
+        writer = FileStorage(self.path)
+        user, state = User(), State()
+        user.email = "betty@hbnb.io"
+        writer.new(user)
+        writer.new(state)
+        writer.save()
+
+        storage = FileStorage(self.path, lazy=True)
+        storage.reload()
+        storage.get(State, state.id)
+        rows = storage.all(columns=["updated_at", "email"])
+        self.assertEqual(rows[f"User.{user.id}"],
+                         {"id": user.id, "updated_at": user.updated_at,
+                          "email": "betty@hbnb.io"})
+        self.assertIsNone(rows[f"State.{state.id}"]["email"])
+        self.assertEqual(list(storage.all(User, columns=["id"])),
+                         [f"User.{user.id}"])
+        self.assertEqual(list(storage._FileStorage__objects),
+                         [f"State.{state.id}"])
+
+    def test_lazy_iter(self):
+        """
+        Tests if iter() builds objects only as it reaches them
+        """
+        writer = FileStorage(self.path)
+        users = [User() for _ in range(3)]
+        for user in users:
+            writer.new(user)
+        writer.new(State())
+        writer.save()
+
+        storage = FileStorage(self.path, lazy=True)
+        storage.reload()
+        objs = storage.iter(User, batch_size=2)
+        first = next(objs)
+        self.assertEqual(list(storage._FileStorage__objects),
+                         [f"User.{first.id}"])
+        self.assertCountEqual([first.id] + [user.id for user in objs],
+                              [user.id for user in users])
+        self.assertEqual(len(list(storage.iter())), 4)
+
+    def test_deferred_timestamps(self):
+        """
+        Tests if stored timestamps are only parsed when they are read
+        """
+        writer = FileStorage(self.path)
+        user = User()
+        writer.new(user)
+        writer.save()
+
+        storage = FileStorage(self.path)
+        storage.reload()
+        copy = storage.all(User)[f"User.{user.id}"]
+        self.assertIsInstance(copy.__dict__["created_at"], str)
+        self.assertEqual(copy.to_dict(), user.to_dict())
+        self.assertEqual(copy.created_at, user.created_at)
+        self.assertIsInstance(copy.__dict__["created_at"], datetime)
+        self.assertIsInstance(copy.__dict__["updated_at"], str)
+        self.assertIn(repr(user.updated_at), str(copy))
+        self.assertIsInstance(copy.__dict__["updated_at"], datetime)
+
+
+class test_fileStorage_codec(unittest.TestCase):
+    """
+    Tests FileStorage with the binary codec
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.hbnb")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_binary_round_trip(self):
+        """
+        Tests if objects survive a save and reload in binary format
+        """
+        storage = FileStorage(self.path, codec="binary")
+        user, state = User(), State()
+        user.first_name = "Wu"
+        user.age = 9
+        user.ratio = 0.5
+        user.tags = ["a", "b"]
+        user.last_name = None
+        state.name = "Texas"
+        storage.new(user)
+        storage.new(state)
+        storage.save()
+        with open(self.path, "rb") as file:
+            self.assertNotIn(b"{", file.read(1))
+
+        reloaded = FileStorage(self.path, codec="binary")
+        reloaded.reload()
+        copy = reloaded.all(User)[f"User.{user.id}"]
+        self.assertEqual(copy.to_dict(), user.to_dict())
+        self.assertEqual(copy.created_at, user.created_at)
+        self.assertEqual(reloaded.all(State)[f"State.{state.id}"].name,
+                         "Texas")
+
+    def test_convert(self):
+        """
+        Tests if convert() translates between JSON and binary files
+        """
+        json_path = os.path.join(self.tmp.name, "file.json")
+        storage = FileStorage(json_path)
+        user = User()
+        storage.new(user)
+        storage.save()
+        self.assertEqual(convert(json_path, self.path, "json", "binary"), 1)
+        back = os.path.join(self.tmp.name, "back.json")
+        convert(self.path, back, "binary", "json")
+        with open(json_path) as original, open(back) as converted:
+            self.assertEqual(json.load(original), json.load(converted))
+
+    def test_unknown_codec(self):
+        """
+        Tests if an unknown codec name is rejected
+        """
+        with self.assertRaises(ValueError):
+            FileStorage(self.path, codec="xml")
+
+
+class test_fileStorage_sharded(unittest.TestCase):
+    """
+    Tests FileStorage with the sharded layout
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+        self.directory = os.path.join(self.tmp.name, "file")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_save_dirty_shards(self):
+        """
+        Tests if save() only rewrites shards holding changed objects
+        """
+        storage = FileStorage(self.path, layout="sharded",
+                              shards={"User": 4})
+        users = [User() for _ in range(20)]
+        state = State()
+        for obj in users + [state]:
+            storage.new(obj)
+        storage.save()
+        files = sorted(os.listdir(self.directory))
+        self.assertIn("State.json", files)
+        self.assertEqual(len([f for f in files if f.startswith("User.")]),
+                         4)
+        state_path = os.path.join(self.directory, "State.json")
+        before = os.stat(state_path).st_ino
+        users[0].first_name = "Wu"
+        storage.new(users[0])
+        storage.save()
+        self.assertEqual(os.stat(state_path).st_ino, before)
+
+        reloaded = FileStorage(self.path, layout="sharded",
+                               shards={"User": 4})
+        reloaded.reload()
+        self.assertEqual(len(reloaded.all(User)), 20)
+        self.assertEqual(
+            reloaded.all(User)[f"User.{users[0].id}"].first_name, "Wu")
+
+    def test_migrate(self):
+        """
+        Tests if a single-file store is migrated to shards
+        """
+        single = FileStorage(self.path)
+        user = User()
+        single.new(user)
+        single.save()
+        storage = FileStorage(self.path, layout="sharded")
+        storage.reload()
+        self.assertIn(f"User.{user.id}", storage.all(User))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory, "User.json")))
+
+    def test_journal_rejected(self):
+        """
+        Tests if journal mode cannot be combined with shards
+        """
+        with self.assertRaises(ValueError):
+            FileStorage(self.path, journal=True, layout="sharded")
+
+
+class test_fileStorage_journal(unittest.TestCase):
+    """
+    Tests FileStorage in journal mode
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_save_appends_changes(self):
+        """
+        Tests if save() appends only new, updated and deleted objects
+        """
+        storage = FileStorage(self.path, journal=True)
+        first, second = User(), User()
+        storage.new(first)
+        storage.new(second)
+        storage.save()
+        storage.save()
+        with open(self.path + ".journal") as file:
+            self.assertEqual(len(file.readlines()), 2)
+        first.first_name = "Wu"
+        storage.new(first)
+        storage.delete(second)
+        storage.save()
+        with open(self.path + ".journal") as file:
+            lines = file.readlines()
+        self.assertEqual(len(lines), 4)
+        self.assertFalse(os.path.exists(self.path))
+
+        reloaded = FileStorage(self.path, journal=True)
+        reloaded.reload()
+        self.assertEqual(list(reloaded.all()), [f"User.{first.id}"])
+        self.assertEqual(reloaded.all()[f"User.{first.id}"].first_name,
+                         "Wu")
+
+    def test_torn_record(self):
+        """
+        Tests if reload() drops a torn last record and keeps the rest
+        """
+        storage = FileStorage(self.path, journal=True)
+        user = User()
+        storage.new(user)
+        storage.save()
+        with open(self.path + ".journal", "a") as file:
+            file.write('{"op": "put", "key": "User.x", "val')
+        reloaded = FileStorage(self.path, journal=True)
+        reloaded.reload()
+        self.assertEqual(list(reloaded.all()), [f"User.{user.id}"])
+        reloaded.new(User())
+        reloaded.save()
+        again = FileStorage(self.path, journal=True)
+        again.reload()
+        self.assertEqual(len(again.all()), 2)
+
+    def test_readers_leave_journal(self):
+        """
+        Tests if reload() neither cuts a record still being written nor
+        compacts a rotated journal, both left to writers
+        """
+        storage = FileStorage(self.path, journal=True)
+        storage.new(User())
+        storage.new(User())
+        storage.save()
+        journal = self.path + ".journal"
+        # a save() with a rotated journal left would start compacting
+        os.replace(journal, journal + ".old")
+        with open(journal, "a") as file:
+            file.write('{"op": "put", "key": "User.x", "val')
+        size = os.path.getsize(journal)
+        reader = FileStorage(self.path, journal=True)
+        reader.reload()
+        self.assertEqual(len(reader.all()), 2)
+        self.assertEqual(os.path.getsize(journal), size)
+        self.assertTrue(os.path.exists(journal + ".old"))
+        storage.compact()
+        self.assertFalse(os.path.exists(journal + ".old"))
+        reader.reload()
+        self.assertEqual(len(reader.all()), 2)
+
+    def test_compact(self):
+        """
+        Tests if compact() folds the journal into the JSON file
+        """
+        storage = FileStorage(self.path, journal=True)
+        user = User()
+        storage.new(user)
+        storage.save()
+        storage.compact()
+        self.assertFalse(os.path.exists(self.path + ".journal"))
+        with open(self.path) as file:
+            self.assertIn(f"User.{user.id}", json.load(file))
+        reloaded = FileStorage(self.path, journal=True)
+        reloaded.reload()
+        self.assertIn(f"User.{user.id}", reloaded.all())
+
+
+class test_fileStorage_bulk(unittest.TestCase):
+    """
+    Tests the FileStorage bulk write API
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_save_many(self):
+        """
+        Tests if save_many() adds instances and dictionaries in one write
+        """
+        storage = FileStorage(self.path)
+        state = State()
+        with patch.object(storage, "save", wraps=storage.save) as save:
+            ids = storage.save_many(
+                [state, {"__class__": "City", "state_id": state.id,
+                         "name": "Austin"}])
+            save.assert_called_once()
+        self.assertEqual(ids[0], state.id)
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.get(City, ids[1]).state_id, state.id)
+        self.assertEqual(
+            storage.new_many([{"state_id": state.id}], cls=City)[0],
+            storage.find(City, name=None)[0].id)
+
+    def test_missing_reference(self):
+        """
+        Tests if new_many() rejects the batch when a reference is missing
+        """
+        storage = FileStorage(self.path)
+        with self.assertRaises(ValueError):
+            storage.new_many([{"__class__": "City", "state_id": "nope"}])
+        with self.assertRaises(ValueError):
+            storage.new_many([{"__class__": "Nope"}])
+        self.assertEqual(storage.count(), 0)
+
+
+class test_fileStorage_bulk_delete(unittest.TestCase):
+    """
+    Tests FileStorage.delete_many() and truncate()
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory and a small object graph
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+        self.storage = FileStorage(self.path)
+        self.state, self.user, self.amenity = State(), User(), Amenity()
+        self.city = City(state_id=self.state.id)
+        self.place = Place(city_id=self.city.id, user_id=self.user.id,
+                           amenity_ids=[self.amenity.id])
+        self.review = Review(place_id=self.place.id, user_id=self.user.id)
+        self.storage.save_many([self.state, self.user, self.amenity,
+                                self.city, self.place, self.review])
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_cascade(self):
+        """
+        Tests if delete_many() follows State -> City -> Place -> Review
+        """
+        with patch.object(self.storage, "save",
+                          wraps=self.storage.save) as save:
+            self.assertEqual(self.storage.delete_many([self.state]), 4)
+            save.assert_called_once()
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(sorted(reloaded.all()),
+                         sorted([f"User.{self.user.id}",
+                                 f"Amenity.{self.amenity.id}"]))
+
+    def test_amenity_ids(self):
+        """
+        Tests if deleting an Amenity only drops it from Place.amenity_ids
+        """
+        self.assertEqual(self.storage.delete_many([self.amenity]), 1)
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.get(Place, self.place.id).amenity_ids, [])
+
+    def test_truncate(self):
+        """
+        Tests if truncate() empties a class with its dependents, or all
+        """
+        self.assertEqual(self.storage.truncate(Place), 2)
+        self.assertEqual(self.storage.count(), 4)
+        self.assertEqual(self.storage.truncate(), 4)
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.count(), 0)
+
+
+class test_fileStorage_transaction(unittest.TestCase):
+    """
+    Tests FileStorage.transaction()
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory and a saved User
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+        self.storage = FileStorage(self.path)
+        self.user = User(first_name="Betty")
+        self.storage.new(self.user)
+        self.storage.save()
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_commit(self):
+        """
+        Tests if saves inside the block become one write at its end
+        """
+        with patch.object(self.storage, "flush",
+                          wraps=self.storage.flush) as flush:
+            with self.storage.transaction():
+                for _ in range(3):
+                    self.storage.new(State())
+                    self.storage.save()
+                flush.assert_not_called()
+            flush.assert_called_once()
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.count(State), 3)
+
+    def test_rollback(self):
+        """
+        Tests if a block that raises puts changed, added and deleted
+        objects back in place
+        """
+        state = State()
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                self.user.first_name = "Holberton"
+                self.storage.new(self.user)
+                self.storage.new(state)
+                self.storage.delete(self.user)
+                raise KeyError
+        self.assertIs(self.storage.get(User, self.user.id), self.user)
+        self.assertEqual(self.user.first_name, "Betty")
+        self.assertIsNone(self.storage.get(State, state.id))
+        self.assertEqual(self.storage.count(), 1)
+
+    def test_nested(self):
+        """
+        Tests if an inner block that raises only undoes its own changes
+        """
+        with self.storage.transaction():
+            self.user.first_name = "Outer"
+            self.storage.new(self.user)
+            with self.assertRaises(KeyError):
+                with self.storage.transaction():
+                    self.user.first_name = "Inner"
+                    self.storage.new(self.user)
+                    self.storage.new(State())
+                    raise KeyError
+            self.assertEqual(self.user.first_name, "Outer")
+            self.assertEqual(self.storage.count(State), 0)
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.get(User, self.user.id).first_name,
+                         "Outer")
+
+    def test_threads(self):
+        """
+        Tests if a block only defers and undoes the changes of the thread
+        that opened it
+        """
+        state = State(name="California")
+
+        def other():
+            self.storage.new(state)
+            self.storage.save()
+
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                self.user.first_name = "Holberton"
+                self.storage.new(self.user)
+                thread = threading.Thread(target=other)
+                thread.start()
+                thread.join()
+                reloaded = FileStorage(self.path)
+                reloaded.reload()
+                self.assertIsNotNone(reloaded.get(State, state.id))
+                raise KeyError
+        self.assertEqual(self.user.first_name, "Betty")
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.storage.save()
+        reloaded = FileStorage(self.path)
+        reloaded.reload()
+        self.assertEqual(reloaded.get(User, self.user.id).first_name,
+                         "Betty")
+        self.assertIsNotNone(reloaded.get(State, state.id))
+
+
+class test_fileStorage_write_behind(unittest.TestCase):
+    """
+    Tests FileStorage in write-behind mode
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_flush(self):
+        """
+        Tests if save() defers the write until flush()
+        """
+        storage = FileStorage(self.path, write_behind=60000)
+        user = User()
+        storage.new(user)
+        storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        storage.sync()
+        with open(self.path) as file:
+            self.assertIn(f"User.{user.id}", json.load(file))
+
+    def test_flush_every(self):
+        """
+        Tests if enough pending changes wake the background flusher
+        """
+        storage = FileStorage(self.path, write_behind=60000, flush_every=2)
+        storage.new(User())
+        storage.save()
+        storage.new(User())
+        with patch.object(storage, "flush",
+                          side_effect=storage.flush) as flush:
+            storage.save()
+            for _ in range(100):
+                if flush.called:
+                    break
+                time.sleep(0.01)
+        with open(self.path) as file:
+            self.assertEqual(len(json.load(file)), 2)
+
+    def test_collected(self):
+        """
+        Tests if a storage with a flusher, and objects it holds, can be
+        collected, writing its pending changes
+        """
+        storage = FileStorage(self.path, write_behind=60000)
+        user = User()
+        storage.new(user)
+        storage.save()
+        ref = weakref.ref(storage)
+        del storage
+        gc.collect()
+        self.assertIsNone(ref())
+        user.first_name = "Betty"
+        with open(self.path) as file:
+            self.assertIn(f"User.{user.id}", json.load(file))
+
 
 if __name__ == "__main__":
     unittest.main()
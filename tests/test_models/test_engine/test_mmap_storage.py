@@ -0,0 +1,221 @@
+#!/usr/bin/python3
+"""
+This module contains tests for the MmapStorage module.
+"""
+import unittest
+import os
+import tempfile
+import threading
+from models.user import User
+from models.state import State
+from models.city import City
+from models.engine.file_storage import FileStorage
+from models.engine.mmap_storage import MmapStorage
+
+
+class test_mmapStorage(unittest.TestCase):
+    """
+    Tests the MmapStorage module
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the store
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.jsonl")
+        self.storage = MmapStorage(self.path)
+        self.storage.reload()
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+
+    def test_all(self):
+        """
+        Tests if all() lists keys by class and decodes on access
+        """
+        user, state = User(), State()
+        state.name = "Texas"
+        self.storage.new(user)
+        self.storage.new(state)
+        self.storage.save()
+
+        reader = MmapStorage(self.path)
+        reader.reload()
+        states = reader.all(State)
+        self.assertEqual(list(states), [f"State.{state.id}"])
+        self.assertIn(f"User.{user.id}", reader.all())
+        self.assertNotIn(f"User.{user.id}", states)
+        self.assertEqual(states[f"State.{state.id}"].name, "Texas")
+        self.assertNotIn(f"User.{user.id}",
+                         reader._MmapStorage__objects)
+        self.assertEqual(reader.get(User, user.id).id, user.id)
+        self.assertIsNone(reader.get("User", state.id))
+        self.assertEqual(reader.count(), 2)
+        self.assertEqual([obj.id for obj in reader.iter(State)], [state.id])
+        self.assertEqual(len(list(reader.iter(batch_size=1))), 2)
+        self.assertEqual(reader.find(State, name="Texas")[0].id, state.id)
+        self.assertEqual(reader.find(State, id__in=[state.id, user.id],
+                                     name__ne="Texas"), [])
+        with self.assertRaises(ValueError):
+            reader.find(State, order_by="nope")
+        self.assertTrue(reader.exists(User, user.id))
+        self.assertEqual(reader.missing(State, [state.id, user.id]),
+                         {user.id})
+        self.assertEqual(reader.count(State), 1)
+        self.assertEqual(reader.stats()["State"]["updated_at"],
+                         state.updated_at)
+
+    def test_columns(self):
+        """
+        Tests if all(columns=...) reads stored lines without decoding
+        objects
+        """
+        user = User()
+        user.first_name = "Betty"
+        self.storage.new(user)
+        self.storage.save()
+        reader = MmapStorage(self.path)
+        reader.reload()
+        self.assertEqual(reader.all(User, columns=["first_name",
+                                                   "updated_at"]),
+                         {f"User.{user.id}": {
+                             "id": user.id, "first_name": "Betty",
+                             "updated_at": user.updated_at}})
+        self.assertEqual(reader._MmapStorage__objects, {})
+
+    def test_save_delete(self):
+        """
+        Tests if updates and deletes reach a reader that reloads
+        """
+        kept, gone = User(), User()
+        self.storage.new(kept)
+        self.storage.new(gone)
+        self.storage.save()
+        reader = MmapStorage(self.path)
+        reader.reload()
+        self.assertEqual(len(reader.all(User)), 2)
+
+        kept.first_name = "Wu"
+        self.storage.new(kept)
+        self.storage.delete(gone)
+        self.storage.save()
+        reader.close()
+        self.assertEqual(list(reader.all(User)), [f"User.{kept.id}"])
+        self.assertEqual(reader.all(User)[f"User.{kept.id}"].first_name,
+                         "Wu")
+
+    def test_save_many(self):
+        """
+        Tests if save_many() appends a batch of objects
+        """
+        ids = self.storage.save_many([{"__class__": "State", "name": "a"},
+                                      State()])
+        reader = MmapStorage(self.path)
+        reader.reload()
+        self.assertEqual(reader.missing(State, ids), set())
+        with self.assertRaises(ValueError):
+            self.storage.new_many([{"state_id": "nope"}], "City")
+
+    def test_delete_many(self):
+        """
+        Tests if delete_many() takes dependents along
+        """
+        state = State()
+        self.storage.save_many([state, {"__class__": "City",
+                                        "state_id": state.id}])
+        self.assertEqual(self.storage.delete_many([state]), 2)
+        reader = MmapStorage(self.path)
+        reader.reload()
+        self.assertEqual(reader.count(), 0)
+
+    def test_transaction(self):
+        """
+        Tests if transaction() appends once and rolls back on error
+        """
+        user = User(first_name="Betty")
+        self.storage.new(user)
+        self.storage.save()
+        state = State()
+        with self.assertRaises(KeyError):
+            with self.storage.transaction():
+                user.first_name = "Holberton"
+                self.storage.new(user)
+                self.storage.new(state)
+                self.storage.delete(user)
+                raise KeyError
+        self.assertEqual(self.storage.get(User, user.id).first_name, "Betty")
+        self.assertIsNone(self.storage.get(State, state.id))
+        size = os.path.getsize(self.path)
+        with self.storage.transaction():
+            self.storage.new(state)
+            self.storage.save()
+            self.assertEqual(os.path.getsize(self.path), size)
+        reader = MmapStorage(self.path)
+        reader.reload()
+        self.assertEqual(reader.count(), 2)
+        with self.storage.transaction():
+            thread = threading.Thread(target=self.storage.save)
+            self.storage.new(City())
+            thread.start()
+            thread.join()
+            self.assertGreater(os.path.getsize(self.path), size)
+
+    def test_compact(self):
+        """
+        Tests if compact() keeps only live objects
+        """
+        user = User()
+        for name in ("a", "b", "c"):
+            user.first_name = name
+            self.storage.new(user)
+            self.storage.save()
+        size = os.path.getsize(self.path)
+        self.storage.compact()
+        self.assertLess(os.path.getsize(self.path), size)
+        reader = MmapStorage(self.path)
+        reader.reload()
+        self.assertEqual(reader.all(User)[f"User.{user.id}"].first_name, "c")
+
+    def test_writers(self):
+        """
+        Tests if two storages appending to the same file, one of them
+        compacting it, keep reading each other's latest lines
+        """
+        user = User()
+        for name in ("a", "b", "c"):
+            user.first_name = name
+            self.storage.new(user)
+            self.storage.save()
+        other = MmapStorage(self.path)
+        other.reload()
+        state = State()
+        other.new(state)
+        other.save()
+        self.storage.compact()
+        city = City()
+        other.new(city)
+        other.save()
+        self.assertEqual(other.get(User, user.id).first_name, "c")
+        self.storage.reload()
+        self.assertIsNotNone(self.storage.get(State, state.id))
+        self.assertIsNotNone(self.storage.get(City, city.id))
+
+    def test_import(self):
+        """
+        Tests if a file.json store is imported on first use
+        """
+        json_path = os.path.join(self.tmp.name, "file.json")
+        storage = FileStorage(json_path)
+        user = User()
+        storage.new(user)
+        storage.save()
+        mapped = MmapStorage(self.path)
+        mapped.reload()
+        self.assertIn(f"User.{user.id}", mapped.all(User))
+
+
+if __name__ == "__main__":
+    unittest.main()
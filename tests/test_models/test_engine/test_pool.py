@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""
+This module contains tests for the pool module.
+"""
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+from sqlalchemy import create_engine, exc
+from models.engine import pool
+
+
+class test_pool(unittest.TestCase):
+    """
+    Tests the pool options and metrics
+    """
+    def setUp(self):
+        """
+        Creates a scratch SQLite database behind a one-connection pool
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.tmp.name, "pool.db"),
+            poolclass=pool.MeteredPool, pool_size=1, max_overflow=1,
+            pool_timeout=0.05)
+        self.metrics = pool.Metrics().attach(self.engine)
+
+    def tearDown(self):
+        """
+        Closes the pool and removes the scratch directory
+        """
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_options(self):
+        """
+        Tests if options() reads the prefixed variables
+        """
+        env = {"HBNB_TEST_POOL_SIZE": "20", "HBNB_TEST_PRE_PING": "0",
+               "HBNB_TEST_POOL_TIMEOUT": "2.5"}
+        with patch.dict(os.environ, env):
+            options = pool.options("HBNB_TEST_")
+        self.assertEqual(options["pool_size"], 20)
+        self.assertEqual(options["pool_timeout"], 2.5)
+        self.assertFalse(options["pool_pre_ping"])
+        self.assertEqual(options["max_overflow"], 10)
+        with patch.dict(os.environ, {"HBNB_TEST_POOL_SIZE": "many"}):
+            with self.assertRaises(ValueError):
+                pool.options("HBNB_TEST_")
+
+    def test_metrics(self):
+        """
+        Tests if checkouts, overflow, timeouts and invalidations are
+        counted
+        """
+        first, second = self.engine.connect(), self.engine.connect()
+        with self.assertRaises(exc.TimeoutError):
+            self.engine.connect()
+        second.invalidate()
+        first.close()
+        second.close()
+        stats = self.metrics.snapshot()
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["peak"], 2)
+        self.assertEqual(stats["overflows"], 1)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["invalidations"], 1)
+        self.assertGreaterEqual(stats["wait_max"], 0.05)
+        self.assertEqual(stats["size"], 1)
+
+    def test_dispose(self):
+        """
+        Tests if the metrics follow the pool that replaces a disposed one
+        """
+        self.engine.dispose()
+        self.engine.connect().close()
+        self.assertIs(self.engine.pool.metrics, self.metrics)
+        self.assertEqual(self.metrics.snapshot()["checkouts"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
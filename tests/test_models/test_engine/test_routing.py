@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+This module contains tests for the routing module.
+"""
+import unittest
+import os
+import tempfile
+import time
+from sqlalchemy import Column, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from models.engine import pool
+from models.engine.routing import Router, RoutingSession
+
+Base = declarative_base()
+
+
+class Row(Base):
+    """
+    Table standing in for the models
+    """
+    __tablename__ = "rows"
+    id = Column(String(60), primary_key=True)
+
+
+class test_router(unittest.TestCase):
+    """
+    Tests Router with SQLite files as primary and replicas
+    """
+    def setUp(self):
+        """
+        Creates a primary and two replicas, each holding one row named
+        after it
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engines = {}
+        for name in ("primary", "first", "second"):
+            engine = create_engine("sqlite:///" + os.path.join(
+                self.tmp.name, name + ".db"))
+            Base.metadata.create_all(engine)
+            with sessionmaker(bind=engine).begin() as session:
+                session.add(Row(id=name))
+            self.engines[name] = engine
+        self.replicas = [(self.engines[name],
+                          pool.Metrics().attach(self.engines[name]))
+                         for name in ("first", "second")]
+        self.router = Router(self.engines["primary"], self.replicas,
+                             sticky=0.1)
+        self.factory = sessionmaker(class_=RoutingSession,
+                                    router=self.router,
+                                    expire_on_commit=False)
+        self.router.watch(self.factory)
+
+    def tearDown(self):
+        """
+        Closes the engines and removes the scratch directory
+        """
+        for engine in self.engines.values():
+            engine.dispose()
+        self.tmp.cleanup()
+
+    def read(self):
+        """
+        Returns the ids a new session reads
+        """
+        with self.factory() as session:
+            return sorted(row.id for row in session.query(Row))
+
+    def test_round_robin(self):
+        """
+        Tests if read transactions alternate between the replicas
+        """
+        self.assertEqual([self.read() for _ in range(3)],
+                         [["first"], ["second"], ["first"]])
+
+    def test_writes(self):
+        """
+        Tests if writes go to the primary, which the session and then
+        the thread keep reading until the sticky window ends
+        """
+        with self.factory() as session:
+            session.add(Row(id="new"))
+            session.flush()
+            self.assertEqual(len(session.query(Row).all()), 2)
+            session.commit()
+        self.assertEqual(self.read(), ["new", "primary"])
+        time.sleep(0.15)
+        self.assertEqual(self.read(), ["first"])
+
+    def test_least_loaded(self):
+        """
+        Tests if least_loaded avoids a replica with connections in use
+        """
+        router = Router(self.engines["primary"], self.replicas,
+                        policy="least_loaded")
+        with self.engines["first"].connect():
+            self.assertIs(router.replica(), self.engines["second"])
+            self.assertIs(router.replica(), self.engines["second"])
+        with self.assertRaises(ValueError):
+            Router(self.engines["primary"], self.replicas, policy="random")
+
+
+if __name__ == "__main__":
+    unittest.main()
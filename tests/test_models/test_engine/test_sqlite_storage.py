@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""
+This module contains tests for the SQLiteStorage class.
+"""
+import unittest
+import os
+import tempfile
+from unittest.mock import patch
+from models.engine.sqlite_storage import SQLiteStorage
+
+
+class test_SQLiteStorage(unittest.TestCase):
+    """
+    Tests the SQLiteStorage engine settings
+
+    The storage methods are DBStorage's; run test_db_storage with
+    HBNB_TYPE_STORAGE=sqlite to test them on SQLite.
+    """
+    def setUp(self):
+        """
+        Creates a scratch directory for the database, outside the test
+        environment that drops every table
+        """
+        self.env = patch.dict(os.environ, {"HBNB_ENV": "dev"})
+        self.env.start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.db")
+
+    def tearDown(self):
+        """
+        Removes the scratch directory
+        """
+        self.tmp.cleanup()
+        self.env.stop()
+
+    def pragma(self, engine, name):
+        """
+        Returns the value of a pragma on a pooled connection
+        """
+        with engine.connect() as connection:
+            return connection.exec_driver_sql(
+                "PRAGMA " + name).scalar()
+
+    def test_file(self):
+        """
+        Tests if a database file is opened in WAL mode with the pragmas
+        """
+        storage = SQLiteStorage(self.path)
+        engine = storage.engine_for("sqlite:///" + self.path)
+        self.assertEqual(self.pragma(engine, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(engine, "foreign_keys"), 1)
+        self.assertEqual(self.pragma(engine, "synchronous"), 1)
+        self.assertEqual(self.pragma(engine, "busy_timeout"), 5000)
+        self.assertFalse(engine.pool._pre_ping)
+        engine.dispose()
+
+    def test_memory(self):
+        """
+        Tests if ":memory:" connections share one in-memory database
+        """
+        storage = SQLiteStorage(":memory:")
+        engine = storage._DBStorage__engine
+        with engine.connect() as first, engine.connect() as second:
+            first.exec_driver_sql("CREATE TABLE t (x)")
+            first.exec_driver_sql("INSERT INTO t VALUES (1)")
+            first.commit()
+            self.assertEqual(second.exec_driver_sql(
+                "SELECT x FROM t").scalar(), 1)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
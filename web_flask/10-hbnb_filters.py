@@ -4,7 +4,7 @@ This module starts a Flask web application.
 """
 
 from models import storage
-from flask import Flask, render_template
+from flask import Flask, abort, jsonify, render_template
 from models.state import State
 from models.amenity import Amenity
 
@@ -24,7 +24,7 @@ def hbnb_filters():
     """
     Renders hbnb_filters page with sorted States and Amenities
     """
-    states = sorted(storage.all(State).values(),
+    states = sorted(storage.all(State, load="cities").values(),
                     key=lambda state: state.name)
     amenities = sorted(storage.all(Amenity).values(),
                        key=lambda amenity: amenity.name)
@@ -32,5 +32,27 @@ def hbnb_filters():
                            states=states, amenities=amenities)
 
 
+@app.route("/stats", strict_slashes=False)
+def stats():
+    """
+    Returns the number of objects and the last update of each class
+    """
+    return jsonify({
+        cls_name: {"count": class_stats["count"],
+                   "updated_at": class_stats["updated_at"] and
+                   class_stats["updated_at"].isoformat()}
+        for cls_name, class_stats in storage.stats().items()})
+
+
+@app.route("/stats/pool", strict_slashes=False)
+def pool_stats():
+    """
+    Returns the database connection pool metrics
+    """
+    if not hasattr(storage, "pool_stats"):
+        abort(404)
+    return jsonify(storage.pool_stats())
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
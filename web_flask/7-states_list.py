@@ -4,7 +4,7 @@ This module starts a Flask web application.
 """
 
 from models import storage
-from flask import Flask, render_template
+from flask import Flask, stream_template
 from models.state import State
 
 app = Flask(__name__)
@@ -23,8 +23,8 @@ def states_list():
     """
     Lists all states in the database
     """
-    states = storage.all(State).values()
-    return render_template("7-states_list.html", states=states)
+    states = storage.iter(State)
+    return stream_template("7-states_list.html", states=states)
 
 
 if __name__ == "__main__":
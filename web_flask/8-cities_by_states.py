@@ -23,7 +23,8 @@ def cities_by_states():
     """
     Returns list of cities by state
     """
-    states = storage.all(State).values()
+    # cities are loaded with the states in one more query, not one each
+    states = storage.all(State, load="cities").values()
     sorted_states = sorted(states, key=lambda state: state.name)
 
     for state in sorted_states:
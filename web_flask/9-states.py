@@ -33,15 +33,10 @@ def states_id(id):
     """
     Renders a state and its cities by ID from the database.
     """
-    states = storage.all(State).values()
-    current_state = None
-    for state in states:
-        if state.id == id:
-            current_state = state
-            current_state.cities.sort(key=lambda city: city.name)
-            break
-
-    if current_state is None:
+    current_state = storage.get(State, id, load="cities")
+    if current_state is not None:
+        current_state.cities.sort(key=lambda city: city.name)
+    else:
         current_state = "not found!"
 
     return render_template("9-states.html", state=current_state)